@@ -1,40 +1,96 @@
 import os
-from flask import Flask, render_template, session, redirect, url_for
-from utils.db import init_db, reset_database
+from flask import Flask, render_template, session, redirect, url_for, jsonify
+from utils.startup import run_startup, startup_done
+from utils.assets import init_assets
+from utils.compression import init_compression
+from utils.sessions import init_sessions, prune_expired_sessions
+from utils.events import prune_notifications
 from routes.transactions import bp as transactions_bp
 from routes.summary import bp as summary_bp
 from routes.auth import bp as auth_bp
+from routes.events import bp as events_bp
+from routes.recurring import bp as recurring_bp
+from routes.budgets import bp as budgets_bp
+from routes.metrics import bp as metrics_bp
+from models.user import User
+from models.transaction import Transaction
+from models.recurring import RecurringRule
+from models.archive import Archive
+from utils.scheduler import scheduler
+from utils.maintenance import MAINTENANCE_WINDOW, run_maintenance
+from utils.sharding import ShardMovingError, sharding_enabled, user_db_connection
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'finance-tracker-secret-key-change-this-in-production-2025')
 
-# Initialize database when app starts (works with both direct run and gunicorn)
-with app.app_context():
-    # Only reset database if explicitly requested via environment variable
-    if os.environ.get('RESET_DB', 'false').lower() == 'true':
-        print("RESET_DB environment variable set - Resetting database...")
-        reset_database()
-        init_db()
-        print("Database reset and initialized with clean state")
-    else:
-        # Check if database exists, if not create it
-        from utils.db import DATABASE
-        if not os.path.exists(DATABASE):
-            print("Database doesn't exist - Creating new database...")
-            init_db()
-            print("Database initialized successfully")
-        else:
-            print("Database exists - Skipping initialization")
+# Embed the initial dashboard data in index.html instead of fetching it after load
+BOOTSTRAP_DASHBOARD = os.environ.get('BOOTSTRAP_DASHBOARD', 'true').lower() == 'true'
+BOOTSTRAP_PAGE_SIZE = int(os.environ.get('BOOTSTRAP_PAGE_SIZE', 100))
+
+# Schema setup runs once in the gunicorn master (gunicorn.conf.py) before workers fork;
+# `python app.py` and servers without that hook run it here instead
+if not startup_done():
+    run_startup(app.static_folder)
+
+init_compression(app)
+init_sessions(app)
+init_assets(app)
 
 app.register_blueprint(transactions_bp)
 app.register_blueprint(summary_bp)
 app.register_blueprint(auth_bp)
+app.register_blueprint(events_bp)
+app.register_blueprint(recurring_bp)
+app.register_blueprint(budgets_bp)
+app.register_blueprint(metrics_bp)
+
+# Background jobs run in whichever worker holds the job's lease
+scheduler.register('recurring', int(os.environ.get('RECURRING_INTERVAL_SECONDS', 3600)), RecurringRule.materialize_due)
+scheduler.register('archive', int(os.environ.get('ARCHIVE_INTERVAL_SECONDS', 86400)), Archive.archive_old)
+scheduler.register('sessions', int(os.environ.get('SESSION_PRUNE_INTERVAL_SECONDS', 86400)), prune_expired_sessions)
+scheduler.register('events', int(os.environ.get('EVENT_PRUNE_INTERVAL_SECONDS', 3600)), prune_notifications)
+scheduler.register('tombstones', int(os.environ.get('TOMBSTONE_PRUNE_INTERVAL_SECONDS', 86400)), Transaction.prune_tombstones)
+scheduler.register('maintenance', int(os.environ.get('MAINTENANCE_INTERVAL_SECONDS', 86400)), run_maintenance,
+                   window=MAINTENANCE_WINDOW or None)
+
+@app.errorhandler(ShardMovingError)
+def handle_shard_moving(e):
+    return jsonify({'error': str(e)}), 503, {'Retry-After': '30'}
+
+@app.before_request
+def start_scheduler():
+    # Started lazily so the thread lives in the serving worker, not a pre-fork parent
+    scheduler.start()
+
+def build_dashboard_bootstrap(user_id):
+    """Collect everything the dashboard needs on first paint using a single connection"""
+    with user_db_connection(user_id) as conn:
+        # Users live in the main database, which is the same file unless sharding is enabled
+        user = User.get_profile(user_id, conn=None if sharding_enabled() else conn)
+        if not user:
+            return None
+        seq = Transaction.current_seq(user_id, conn=conn)
+        transactions, has_more = Transaction.get_page(user_id, BOOTSTRAP_PAGE_SIZE, conn=conn)
+        return {
+            'user': {'id': user['id'], 'username': user['username']},
+            'seq': seq,
+            'transactions': transactions,
+            'has_more': has_more,
+            'summary': Transaction.summary(user_id, conn=conn),
+            'current_month_summary': Transaction.current_month_summary(user_id, conn=conn)
+        }
 
 @app.route('/')
 def index():
     if 'user_id' not in session:
         return redirect(url_for('login_page'))
-    return render_template('index.html')
+    bootstrap = None
+    if BOOTSTRAP_DASHBOARD:
+        bootstrap = build_dashboard_bootstrap(session['user_id'])
+        if bootstrap is None:
+            session.clear()  # Clear invalid session
+            return redirect(url_for('login_page'))
+    return render_template('index.html', bootstrap=bootstrap)
 
 @app.route('/login')
 def login_page():
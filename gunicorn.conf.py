@@ -0,0 +1,18 @@
+# Gunicorn settings (loaded automatically from the working directory, or with -c gunicorn.conf.py)
+import os
+
+# Threaded workers keep long-lived live-update streams from blocking other requests.
+# utils/events.py reads the same GUNICORN_THREADS to cap open streams below the pool size.
+worker_class = 'gthread'
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+
+
+def on_starting(server):
+    """Create/migrate the database and precompress assets once, in the master, before any worker forks.
+
+    Workers inherit the flag set by run_startup() and skip this work when they import app.py,
+    so a new worker only pays for imports when scaling up.
+    """
+    from utils.startup import run_startup
+    run_startup()
@@ -0,0 +1,147 @@
+import os
+from datetime import date
+from utils.sharding import data_database_paths, open_database
+
+# Transactions dated before the first day of (current month - horizon) are moved to the archive
+ARCHIVE_HORIZON_MONTHS = max(1, int(os.environ.get('ARCHIVE_HORIZON_MONTHS', 12)))
+
+TRANSACTION_COLUMNS = 'id, user_id, amount, category, type, date, description, created_at, seq, recurring_rule_id'
+
+
+def archive_cutoff(today=None):
+    """First date that stays in the hot table"""
+    today = today or date.today()
+    month_index = today.year * 12 + today.month - 1 - ARCHIVE_HORIZON_MONTHS
+    return date(month_index // 12, month_index % 12 + 1, 1).isoformat()
+
+
+class Archive:
+    """Cold storage for old transactions plus per-month aggregates.
+
+    transactions_archive keeps the full rows (same ids) and monthly_aggregates keeps
+    their totals per (month, type, category), so summaries read the small aggregate
+    table instead of the archived rows. archive_state.archived_before marks the
+    boundary: rows dated on/after it are always in the hot table.
+    """
+
+    @staticmethod
+    def archived_before(conn, user_id):
+        row = conn.execute("SELECT archived_before FROM archive_state WHERE user_id = ?", (user_id,)).fetchone()
+        return row['archived_before'] if row else None
+
+    @staticmethod
+    def needs_archive(conn, user_id, start_date=None):
+        """True if rows on/after start_date (or any rows, if None) may be in the archive"""
+        archived_before = Archive.archived_before(conn, user_id)
+        return archived_before is not None and (not start_date or start_date < archived_before)
+
+    @staticmethod
+    def get_rows(conn, user_id, start_date=None, end_date=None):
+        query = f"SELECT {TRANSACTION_COLUMNS} FROM transactions_archive WHERE user_id = ?"
+        params = [user_id]
+        if start_date:
+            query += " AND date >= ?"
+            params.append(start_date)
+        if end_date:
+            query += " AND date <= ?"
+            params.append(end_date)
+        return [dict(row) for row in conn.execute(query + " ORDER BY date DESC", params).fetchall()]
+
+    @staticmethod
+    def get_by_id(conn, user_id, transaction_id):
+        row = conn.execute(
+            f"SELECT {TRANSACTION_COLUMNS} FROM transactions_archive WHERE id = ? AND user_id = ?",
+            (transaction_id, user_id)
+        ).fetchone()
+        return dict(row) if row else None
+
+    @staticmethod
+    def totals_by_category(conn, user_id):
+        """[(type, category, total)] over the whole archive, read from the aggregates"""
+        return conn.execute(
+            """
+            SELECT type, category, SUM(total) AS total
+            FROM monthly_aggregates
+            WHERE user_id = ?
+            GROUP BY type, category
+            """,
+            (user_id,)
+        ).fetchall()
+
+    @staticmethod
+    def restore(conn, user_id, transaction_id):
+        """Move one archived row back to the hot table (call inside the caller's write transaction).
+
+        Edits and deletes then go through the normal hot-table path; the next
+        archive run moves the row back if it is still old.
+        """
+        row = Archive.get_by_id(conn, user_id, transaction_id)
+        if not row:
+            return False
+        conn.execute(
+            """
+            UPDATE monthly_aggregates SET total = total - ?, count = count - 1
+            WHERE user_id = ? AND month = ? AND type = ? AND category = ?
+            """,
+            (row['amount'], user_id, row['date'][:7], row['type'], row['category'])
+        )
+        conn.execute("DELETE FROM monthly_aggregates WHERE user_id = ? AND count <= 0", (user_id,))
+        conn.execute(
+            f"INSERT INTO transactions ({TRANSACTION_COLUMNS}) SELECT {TRANSACTION_COLUMNS} FROM transactions_archive WHERE id = ?",
+            (transaction_id,)
+        )
+        conn.execute("DELETE FROM transactions_archive WHERE id = ?", (transaction_id,))
+        return True
+
+    @staticmethod
+    def archive_old(today=None):
+        """Move every user's transactions older than the horizon into the archive; returns rows moved"""
+        cutoff = archive_cutoff(today)
+        moved = 0
+        for path in data_database_paths():
+            conn = open_database(path)
+            try:
+                user_ids = [row['user_id'] for row in conn.execute(
+                    "SELECT DISTINCT user_id FROM transactions WHERE date < ?", (cutoff,)
+                ).fetchall()]
+                for user_id in user_ids:
+                    # One write transaction per user keeps lock hold times short
+                    conn.execute("BEGIN IMMEDIATE")
+                    conn.execute(
+                        """
+                        INSERT INTO monthly_aggregates (user_id, month, type, category, total, count)
+                        SELECT user_id, substr(date, 1, 7), type, category, SUM(amount), COUNT(*)
+                        FROM transactions
+                        WHERE user_id = ? AND date < ?
+                        GROUP BY substr(date, 1, 7), type, category
+                        ON CONFLICT(user_id, month, type, category) DO UPDATE SET
+                            total = total + excluded.total,
+                            count = count + excluded.count
+                        """,
+                        (user_id, cutoff)
+                    )
+                    cursor = conn.execute(
+                        f"""
+                        INSERT INTO transactions_archive ({TRANSACTION_COLUMNS})
+                        SELECT {TRANSACTION_COLUMNS} FROM transactions WHERE user_id = ? AND date < ?
+                        """,
+                        (user_id, cutoff)
+                    )
+                    moved += cursor.rowcount
+                    conn.execute("DELETE FROM transactions WHERE user_id = ? AND date < ?", (user_id, cutoff))
+                    conn.execute(
+                        """
+                        INSERT INTO archive_state (user_id, archived_before) VALUES (?, ?)
+                        ON CONFLICT(user_id) DO UPDATE SET archived_before = MAX(archived_before, excluded.archived_before)
+                        """,
+                        (user_id, cutoff)
+                    )
+                    conn.commit()
+            finally:
+                conn.close()
+        return moved
+
+
+if __name__ == '__main__':
+    # Run from cron or by hand: python -m models.archive
+    print(f"Archived {Archive.archive_old()} transaction(s) dated before {archive_cutoff()}")
@@ -0,0 +1,123 @@
+import os
+from datetime import date
+from utils.sharding import get_user_db_connection, user_db_connection
+
+# Spend at or above this share of the limit is reported as a warning
+BUDGET_WARNING_RATIO = float(os.environ.get('BUDGET_WARNING_RATIO', 0.8))
+
+
+def _status(category, month, monthly_limit, spent):
+    spent = round(spent or 0, 2)
+    if spent > monthly_limit:
+        status = 'over'
+    elif spent >= monthly_limit * BUDGET_WARNING_RATIO:
+        status = 'warning'
+    else:
+        status = 'ok'
+    return {
+        'category': category,
+        'month': month,
+        'monthly_limit': monthly_limit,
+        'spent': spent,
+        'remaining': round(monthly_limit - spent, 2),
+        'status': status
+    }
+
+
+class Budget:
+    """Per-category monthly budgets backed by running spend counters.
+
+    category_spend holds one row per (user, category, month) with the total of
+    expense transactions, kept current by Transaction.create/update/delete, so
+    budget checks are primary-key lookups instead of SUMs over transactions.
+    """
+
+    @staticmethod
+    def apply_spend(conn, user_id, type_, category, date_, delta):
+        """Adjust the running counter for one expense; call inside the transaction write"""
+        if type_ != 'expense' or not delta:
+            return
+        conn.execute(
+            """
+            INSERT INTO category_spend (user_id, category, month, spent) VALUES (?, ?, ?, ?)
+            ON CONFLICT(user_id, category, month) DO UPDATE SET spent = spent + excluded.spent
+            """,
+            (user_id, category, date_[:7], delta)
+        )
+
+    @staticmethod
+    def apply_change(conn, user_id, old=None, new=None):
+        """Move spend from the old version of a transaction row to the new one (either may be None)"""
+        if old is not None:
+            Budget.apply_spend(conn, user_id, old['type'], old['category'], old['date'], -old['amount'])
+        if new is not None:
+            Budget.apply_spend(conn, user_id, new['type'], new['category'], new['date'], new['amount'])
+
+    @staticmethod
+    def upsert(user_id, category, monthly_limit):
+        if monthly_limit <= 0:
+            raise ValueError("Monthly limit must be greater than zero")
+        conn = get_user_db_connection(user_id)
+        try:
+            conn.execute(
+                """
+                INSERT INTO budgets (user_id, category, monthly_limit) VALUES (?, ?, ?)
+                ON CONFLICT(user_id, category) DO UPDATE SET monthly_limit = excluded.monthly_limit
+                """,
+                (user_id, category, monthly_limit)
+            )
+            conn.commit()
+            return conn.execute(
+                "SELECT id FROM budgets WHERE user_id = ? AND category = ?", (user_id, category)
+            ).fetchone()['id']
+        finally:
+            conn.close()
+
+    @staticmethod
+    def delete(user_id, budget_id):
+        conn = get_user_db_connection(user_id)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM budgets WHERE id = ? AND user_id = ?", (budget_id, user_id))
+            conn.commit()
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    @staticmethod
+    def check(user_id, category, date_, conn=None):
+        """Budget status for the category/month a transaction falls in, or None if unbudgeted"""
+        month = date_[:7]
+        with user_db_connection(user_id, conn) as conn:
+            row = conn.execute(
+                """
+                SELECT b.monthly_limit, s.spent
+                FROM budgets b
+                LEFT JOIN category_spend s
+                    ON s.user_id = b.user_id AND s.category = b.category AND s.month = ?
+                WHERE b.user_id = ? AND b.category = ?
+                """,
+                (month, user_id, category)
+            ).fetchone()
+        return _status(category, month, row['monthly_limit'], row['spent']) if row else None
+
+    @staticmethod
+    def status(user_id, month=None):
+        """Status of every budget for a month (default: current month) from the counters alone"""
+        month = month or date.today().strftime('%Y-%m')
+        conn = get_user_db_connection(user_id)
+        try:
+            rows = conn.execute(
+                """
+                SELECT b.id, b.category, b.monthly_limit, s.spent
+                FROM budgets b
+                LEFT JOIN category_spend s
+                    ON s.user_id = b.user_id AND s.category = b.category AND s.month = ?
+                WHERE b.user_id = ?
+                ORDER BY b.category
+                """,
+                (month, user_id)
+            ).fetchall()
+        finally:
+            conn.close()
+        return [dict(_status(row['category'], month, row['monthly_limit'], row['spent']), id=row['id']) for row in rows]
@@ -0,0 +1,174 @@
+import calendar
+import os
+from datetime import date, datetime, timedelta
+from utils.sharding import get_user_db_connection, data_database_paths, open_database
+from utils import events
+from models.transaction import Transaction
+from models.budget import Budget
+
+FREQUENCIES = ('daily', 'weekly', 'monthly', 'yearly')
+
+# Rules processed per write transaction when materializing occurrences
+RECURRING_BATCH_SIZE = int(os.environ.get('RECURRING_BATCH_SIZE', 200))
+
+
+def _add_months(start, months):
+    """Shift a date by whole months, clamping the day (Jan 31 + 1 month -> Feb 28/29)"""
+    month_index = start.month - 1 + months
+    year = start.year + month_index // 12
+    month = month_index % 12 + 1
+    return date(year, month, min(start.day, calendar.monthrange(year, month)[1]))
+
+
+def occurrence_date(start, frequency, index):
+    """Date of the index-th occurrence (0-based) of a rule anchored at start"""
+    if frequency == 'daily':
+        return start + timedelta(days=index)
+    if frequency == 'weekly':
+        return start + timedelta(weeks=index)
+    if frequency == 'monthly':
+        return _add_months(start, index)
+    if frequency == 'yearly':
+        return _add_months(start, 12 * index)
+    raise ValueError(f"Unknown frequency: {frequency}")
+
+
+class RecurringRule:
+    @staticmethod
+    def create(user_id, amount, category, type_, frequency, start_date, end_date=None, description=""):
+        if frequency not in FREQUENCIES:
+            raise ValueError(f"Frequency must be one of: {', '.join(FREQUENCIES)}")
+        start = datetime.strptime(start_date, '%Y-%m-%d').date()
+        if end_date and datetime.strptime(end_date, '%Y-%m-%d').date() < start:
+            raise ValueError("End date cannot be before start date")
+
+        conn = get_user_db_connection(user_id)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                INSERT INTO recurring_rules
+                    (user_id, amount, category, type, description, frequency, start_date, end_date, next_index, next_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?)
+                """,
+                (user_id, amount, category, type_, description, frequency, start_date, end_date or None, start_date)
+            )
+            conn.commit()
+            return cursor.lastrowid
+        finally:
+            conn.close()
+
+    @staticmethod
+    def get_all(user_id):
+        conn = get_user_db_connection(user_id)
+        try:
+            rules = conn.execute(
+                "SELECT * FROM recurring_rules WHERE user_id = ? ORDER BY next_date",
+                (user_id,)
+            ).fetchall()
+            return [dict(row) for row in rules]
+        finally:
+            conn.close()
+
+    @staticmethod
+    def delete(user_id, rule_id):
+        """Delete a rule; transactions it already created are kept"""
+        conn = get_user_db_connection(user_id)
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM recurring_rules WHERE id = ? AND user_id = ?", (rule_id, user_id))
+            conn.commit()
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    @staticmethod
+    def materialize_due(today=None, user_id=None, rule_id=None, batch_size=RECURRING_BATCH_SIZE):
+        """Create due occurrences, one write transaction per batch of rules.
+
+        Covers every user's rules unless limited to one user's and/or a single rule.
+
+        Safe to re-run at any time: the unique (recurring_rule_id, date) index makes
+        inserts idempotent and next_date only advances in the same transaction, so a
+        missed or interrupted run simply catches up on the next call.
+        Returns the number of transactions created.
+        """
+        today = today or date.today()
+        if user_id is not None:
+            connect = lambda: get_user_db_connection(user_id)
+            return RecurringRule._materialize_database(connect, today, user_id, rule_id, batch_size)
+        created = 0
+        for path in data_database_paths():
+            created += RecurringRule._materialize_database(lambda: open_database(path), today, None, rule_id, batch_size)
+        return created
+
+    @staticmethod
+    def _materialize_database(connect, today, user_id, rule_id, batch_size):
+        query = "SELECT * FROM recurring_rules WHERE active = 1 AND next_date <= ?"
+        params = [today.isoformat()]
+        # A user's file (the main database when sharding is off) also holds other users' rules
+        if user_id is not None:
+            query += " AND user_id = ?"
+            params.append(user_id)
+        if rule_id is not None:
+            query += " AND id = ?"
+            params.append(rule_id)
+        created = 0
+        while True:
+            conn = connect()
+            try:
+                # Hold the write lock from the read onwards so the batch can't race a shard move
+                conn.execute("BEGIN IMMEDIATE")
+                rules = conn.execute(query + " ORDER BY id LIMIT ?", params + [batch_size]).fetchall()
+                if not rules:
+                    conn.rollback()
+                    break
+
+                rows, rule_updates, user_ids = [], [], set()
+                for rule in rules:
+                    start = datetime.strptime(rule['start_date'], '%Y-%m-%d').date()
+                    end = datetime.strptime(rule['end_date'], '%Y-%m-%d').date() if rule['end_date'] else None
+                    index = rule['next_index']
+                    occurrence = occurrence_date(start, rule['frequency'], index)
+                    while occurrence <= today and (end is None or occurrence <= end):
+                        rows.append((rule['user_id'], rule['amount'], rule['category'], rule['type'],
+                                     occurrence.isoformat(), rule['description'], rule['id']))
+                        user_ids.add(rule['user_id'])
+                        index += 1
+                        occurrence = occurrence_date(start, rule['frequency'], index)
+                    active = 0 if end is not None and occurrence > end else 1
+                    rule_updates.append((index, occurrence.isoformat(), active, rule['id']))
+
+                # One sequence bump per user covers every row this batch inserts for them
+                seqs = {user_id: Transaction._next_seq(conn, user_id) for user_id in user_ids}
+                cursor = conn.cursor()
+                for row in rows:
+                    cursor.execute(
+                        """
+                        INSERT OR IGNORE INTO transactions
+                            (user_id, amount, category, type, date, description, recurring_rule_id, seq)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                        """,
+                        row + (seqs[row[0]],)
+                    )
+                    # Only rows actually inserted (not ignored duplicates) count towards budgets
+                    if cursor.rowcount > 0:
+                        created += 1
+                        user_id, amount, category, type_, occurrence_iso = row[:5]
+                        Budget.apply_spend(conn, user_id, type_, category, occurrence_iso, amount)
+                cursor.executemany(
+                    "UPDATE recurring_rules SET next_index = ?, next_date = ?, active = ? WHERE id = ?",
+                    rule_updates
+                )
+                conn.commit()
+            finally:
+                conn.close()
+
+            for user_id, seq in seqs.items():
+                events.publish(user_id, 'changes', {'seq': seq})
+        return created
+
+
+if __name__ == '__main__':
+    # Run from cron or by hand: python -m models.recurring
+    print(f"Created {RecurringRule.materialize_due()} recurring transaction(s)")
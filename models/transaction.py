@@ -1,118 +1,278 @@
-from utils.db import get_db_connection
+import os
+import time
+from utils.sharding import data_database_paths, get_user_db_connection, open_database, user_db_connection
+from utils import events
+from models.budget import Budget
+from models.archive import Archive
+from utils.singleflight import SingleFlight
+
+# Identical summary computations running at the same time (several tabs, overlapping refreshes) share one result
+_summaries = SingleFlight('summary')
+
+# Delete tombstones are kept this long; clients that last synced before that get a full snapshot
+TOMBSTONE_RETENTION_DAYS = int(os.environ.get('TOMBSTONE_RETENTION_DAYS', 30))
+
+def _by_category(totals):
+    return [{'category': category, 'total': total}
+            for category, total in sorted(totals.items(), key=lambda item: item[1], reverse=True)]
 
 class Transaction:
+    @staticmethod
+    def _next_seq(conn, user_id):
+        """Bump and return the user's change sequence inside the caller's write transaction"""
+        conn.execute(
+            """
+            INSERT INTO sync_state (user_id, seq) VALUES (?, 1)
+            ON CONFLICT(user_id) DO UPDATE SET seq = seq + 1
+            """,
+            (user_id,)
+        )
+        return conn.execute("SELECT seq FROM sync_state WHERE user_id = ?", (user_id,)).fetchone()['seq']
+
     @staticmethod
     def create(user_id, amount, category, type_, date, description=""):
-        conn = get_db_connection()
+        conn = get_user_db_connection(user_id)
         cursor = conn.cursor()
+        seq = Transaction._next_seq(conn, user_id)
         cursor.execute(
             """
-            INSERT INTO transactions (user_id, amount, category, type, date, description)
-            VALUES (?, ?, ?, ?, ?, ?)
+            INSERT INTO transactions (user_id, amount, category, type, date, description, seq)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
             """,
-            (user_id, amount, category, type_, date, description)
+            (user_id, amount, category, type_, date, description, seq)
         )
+        Budget.apply_spend(conn, user_id, type_, category, date, amount)
         conn.commit()
         transaction_id = cursor.lastrowid
         conn.close()
+        events.publish(user_id, 'changes', {'seq': seq})
         return transaction_id
 
     @staticmethod
     def delete(user_id, transaction_id):
-        conn = get_db_connection()
+        conn = get_user_db_connection(user_id)
         cursor = conn.cursor()
+        # Lock before reading the old row so concurrent writes can't skew the budget counters
+        cursor.execute("BEGIN IMMEDIATE")
+        # Archived rows are moved back to the hot table before they are changed
+        Archive.restore(conn, user_id, transaction_id)
+        old = cursor.execute(
+            "SELECT type, category, date, amount FROM transactions WHERE id = ? AND user_id = ?",
+            (transaction_id, user_id)
+        ).fetchone()
         cursor.execute("DELETE FROM transactions WHERE id = ? AND user_id = ?", (transaction_id, user_id))
         deleted = cursor.rowcount > 0
+        if deleted:
+            Budget.apply_change(conn, user_id, old=old)
+            # Leave a tombstone so syncing clients learn about the delete
+            seq = Transaction._next_seq(conn, user_id)
+            cursor.execute(
+                "INSERT OR REPLACE INTO transaction_tombstones (transaction_id, user_id, seq, deleted_at) VALUES (?, ?, ?, ?)",
+                (transaction_id, user_id, seq, time.time())
+            )
         conn.commit()
         conn.close()
+        if deleted:
+            events.publish(user_id, 'changes', {'seq': seq})
         return deleted
     
     @staticmethod
     def update(user_id, transaction_id, amount, category, type_, date, description=""):
-        conn = get_db_connection()
+        conn = get_user_db_connection(user_id)
         cursor = conn.cursor()
+        # Lock before reading the old row so concurrent writes can't skew the budget counters
+        cursor.execute("BEGIN IMMEDIATE")
+        # Archived rows are moved back to the hot table before they are changed
+        Archive.restore(conn, user_id, transaction_id)
+        old = cursor.execute(
+            "SELECT type, category, date, amount FROM transactions WHERE id = ? AND user_id = ?",
+            (transaction_id, user_id)
+        ).fetchone()
+        seq = Transaction._next_seq(conn, user_id)
         cursor.execute(
             """
             UPDATE transactions 
-            SET amount = ?, category = ?, type = ?, date = ?, description = ?
+            SET amount = ?, category = ?, type = ?, date = ?, description = ?, seq = ?
             WHERE id = ? AND user_id = ?
             """,
-            (amount, category, type_, date, description, transaction_id, user_id)
+            (amount, category, type_, date, description, seq, transaction_id, user_id)
         )
         updated = cursor.rowcount > 0
-        conn.commit()
+        if updated:
+            Budget.apply_change(conn, user_id, old=old,
+                                new={'type': type_, 'category': category, 'date': date, 'amount': amount})
+            conn.commit()
+        else:
+            conn.rollback()  # Nothing changed, don't advance the sequence
         conn.close()
+        if updated:
+            events.publish(user_id, 'changes', {'seq': seq})
         return updated
     
     @staticmethod
     def get_by_id(user_id, transaction_id):
-        conn = get_db_connection()
+        conn = get_user_db_connection(user_id)
         cursor = conn.cursor()
         transaction = cursor.execute(
             "SELECT * FROM transactions WHERE id = ? AND user_id = ?", 
             (transaction_id, user_id)
         ).fetchone()
+        transaction = dict(transaction) if transaction else Archive.get_by_id(conn, user_id, transaction_id)
         conn.close()
-        return dict(transaction) if transaction else None
+        return transaction
 
     @staticmethod
-    def get_all(user_id):
-        conn = get_db_connection()
-        transactions = conn.execute("SELECT * FROM transactions WHERE user_id = ? ORDER BY date DESC", (user_id,)).fetchall()
-        conn.close()
-        return [dict(row) for row in transactions]
+    def get_all(user_id, start_date=None, end_date=None, conn=None):
+        """Transactions newest first, optionally limited to a date range (inclusive).
+
+        The archive is only read when the range reaches back past the archive boundary.
+        """
+        query = "SELECT * FROM transactions WHERE user_id = ?"
+        params = [user_id]
+        if start_date:
+            query += " AND date >= ?"
+            params.append(start_date)
+        if end_date:
+            query += " AND date <= ?"
+            params.append(end_date)
+        with user_db_connection(user_id, conn) as conn:
+            transactions = [dict(row) for row in conn.execute(query + " ORDER BY date DESC", params).fetchall()]
+            if Archive.needs_archive(conn, user_id, start_date):
+                transactions += Archive.get_rows(conn, user_id, start_date, end_date)
+                transactions.sort(key=lambda row: row['date'], reverse=True)
+        return transactions
 
     @staticmethod
-    def summary(user_id):
-        conn = get_db_connection()
-        total_income = conn.execute('SELECT COALESCE(SUM(amount), 0) as total FROM transactions WHERE user_id = ? AND type = "income"', (user_id,)).fetchone()['total']
-        total_expenses = conn.execute('SELECT COALESCE(SUM(amount), 0) as total FROM transactions WHERE user_id = ? AND type = "expense"', (user_id,)).fetchone()['total']
-        expense_categories = conn.execute('''
-            SELECT category, SUM(amount) as total 
-            FROM transactions 
-            WHERE user_id = ? AND type = "expense" 
-            GROUP BY category
-            ORDER BY total DESC
-        ''', (user_id,)).fetchall()
-        income_categories = conn.execute('''
-            SELECT category, SUM(amount) as total 
-            FROM transactions 
-            WHERE user_id = ? AND type = "income" 
-            GROUP BY category
-            ORDER BY total DESC
+    def current_seq(user_id, conn=None):
+        """Latest change sequence number for the user (0 if nothing has changed yet)"""
+        with user_db_connection(user_id, conn) as conn:
+            row = conn.execute("SELECT seq FROM sync_state WHERE user_id = ?", (user_id,)).fetchone()
+        return row['seq'] if row else 0
+
+    @staticmethod
+    def changes_since(user_id, since, conn=None):
+        """Rows created/updated and ids deleted after sequence number `since`"""
+        with user_db_connection(user_id, conn) as conn:
+            state = conn.execute("SELECT seq, pruned_seq FROM sync_state WHERE user_id = ?", (user_id,)).fetchone()
+            seq, pruned_seq = (state['seq'], state['pruned_seq']) if state else (0, 0)
+            # Client is ahead of the server (e.g. database was reset), or older than the
+            # retained tombstones so deletes may have been missed: send a full snapshot
+            if since > seq or since < pruned_seq:
+                return {'seq': seq, 'reset': True, 'changed': Transaction.get_all(user_id, conn=conn), 'deleted': []}
+            changed = conn.execute(
+                "SELECT * FROM transactions WHERE user_id = ? AND seq > ? ORDER BY date DESC",
+                (user_id, since)
+            ).fetchall()
+            deleted = conn.execute(
+                "SELECT transaction_id FROM transaction_tombstones WHERE user_id = ? AND seq > ?",
+                (user_id, since)
+            ).fetchall()
+        return {
+            'seq': seq,
+            'reset': False,
+            'changed': [dict(row) for row in changed],
+            'deleted': [row['transaction_id'] for row in deleted]
+        }
+
+    @staticmethod
+    def prune_tombstones(now=None):
+        """Drop tombstones older than TOMBSTONE_RETENTION_DAYS in every database; returns rows removed"""
+        cutoff = (now or time.time()) - TOMBSTONE_RETENTION_DAYS * 86400
+        removed = 0
+        for path in data_database_paths():
+            conn = open_database(path)
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                # Remember the newest pruned seq per user so changes_since knows which clients must reset
+                conn.execute(
+                    """
+                    UPDATE sync_state SET pruned_seq = MAX(pruned_seq, (
+                        SELECT MAX(t.seq) FROM transaction_tombstones t
+                        WHERE t.user_id = sync_state.user_id AND t.deleted_at < ?
+                    ))
+                    WHERE user_id IN (SELECT user_id FROM transaction_tombstones WHERE deleted_at < ?)
+                    """,
+                    (cutoff, cutoff)
+                )
+                removed += conn.execute("DELETE FROM transaction_tombstones WHERE deleted_at < ?", (cutoff,)).rowcount
+                conn.commit()
+            finally:
+                conn.close()
+        return removed
+
+    @staticmethod
+    def get_page(user_id, limit, offset=0, conn=None):
+        """Return (rows, has_more) for one page of the newest transactions"""
+        with user_db_connection(user_id, conn) as conn:
+            rows = conn.execute(
+                "SELECT * FROM transactions WHERE user_id = ? ORDER BY date DESC, id DESC LIMIT ? OFFSET ?",
+                (user_id, limit + 1, offset)
+            ).fetchall()
+            # Pages only cover the hot table; archived rows arrive with the full list
+            has_more = len(rows) > limit or Archive.needs_archive(conn, user_id)
+        return [dict(row) for row in rows[:limit]], has_more
+
+    @staticmethod
+    def summary(user_id, conn=None):
+        """All-time totals: live sums over the hot table plus the archive's monthly aggregates"""
+        with user_db_connection(user_id, conn) as conn:
+            # Keyed by the change sequence, so requests never share a result computed before their data changed
+            key = (user_id, 'summary', Transaction.current_seq(user_id, conn=conn))
+            return _summaries.do(key, lambda: Transaction._compute_summary(user_id, conn))
+
+    @staticmethod
+    def _compute_summary(user_id, conn):
+        rows = conn.execute('''
+            SELECT type, category, SUM(amount) as total
+            FROM transactions
+            WHERE user_id = ?
+            GROUP BY type, category
         ''', (user_id,)).fetchall()
-        conn.close()
+        rows += Archive.totals_by_category(conn, user_id)
+        totals = {'income': {}, 'expense': {}}
+        for row in rows:
+            by_category = totals[row['type']]
+            by_category[row['category']] = by_category.get(row['category'], 0) + row['total']
+        total_income = sum(totals['income'].values())
+        total_expenses = sum(totals['expense'].values())
         return {
             'total_income': total_income,
             'total_expenses': total_expenses,
             'current_balance': total_income - total_expenses,
-            'expenses_by_category': [dict(row) for row in expense_categories],
-            'income_by_category': [dict(row) for row in income_categories]
+            'expenses_by_category': _by_category(totals['expense']),
+            'income_by_category': _by_category(totals['income'])
         }
 
     @staticmethod
-    def current_month_summary(user_id):
-        conn = get_db_connection()
-        # Get current month's start and end dates
-        from datetime import datetime, date
-        now = datetime.now()
-        start_of_month = date(now.year, now.month, 1)
-        if now.month == 12:
-            end_of_month = date(now.year + 1, 1, 1)
-        else:
-            end_of_month = date(now.year, now.month + 1, 1)
-        
+    def current_month_summary(user_id, conn=None):
+        # The current month is always in the hot table (ARCHIVE_HORIZON_MONTHS >= 1)
+        with user_db_connection(user_id, conn) as conn:
+            # Get current month's start and end dates
+            from datetime import datetime, date
+            now = datetime.now()
+            start_of_month = date(now.year, now.month, 1)
+            if now.month == 12:
+                end_of_month = date(now.year + 1, 1, 1)
+            else:
+                end_of_month = date(now.year, now.month + 1, 1)
+
+            key = (user_id, 'current_month', start_of_month, Transaction.current_seq(user_id, conn=conn))
+            return _summaries.do(
+                key, lambda: Transaction._compute_current_month_summary(user_id, conn, start_of_month, end_of_month)
+            )
+
+    @staticmethod
+    def _compute_current_month_summary(user_id, conn, start_of_month, end_of_month):
         total_income = conn.execute(
             'SELECT COALESCE(SUM(amount), 0) as total FROM transactions WHERE user_id = ? AND type = "income" AND date >= ? AND date < ?', 
             (user_id, start_of_month, end_of_month)
         ).fetchone()['total']
-        
+    
         total_expenses = conn.execute(
             'SELECT COALESCE(SUM(amount), 0) as total FROM transactions WHERE user_id = ? AND type = "expense" AND date >= ? AND date < ?', 
             (user_id, start_of_month, end_of_month)
         ).fetchone()['total']
-        
-        conn.close()
+    
         return {
             'total_income': total_income,
             'total_expenses': total_expenses,
@@ -1,5 +1,13 @@
+import os
 import bcrypt
-from utils.db import get_db_connection
+from utils.cache import TTLCache
+from utils.db import get_db_connection, db_connection
+
+# Per-worker cache of the public profile (id, username) used to confirm identity on each request
+PROFILE_CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE', 10000))
+PROFILE_CACHE_SECONDS = float(os.environ.get('PROFILE_CACHE_SECONDS', 60))
+
+_profiles = TTLCache(PROFILE_CACHE_SIZE, PROFILE_CACHE_SECONDS)
 
 class User:
     @staticmethod
@@ -66,14 +74,39 @@ class User:
             conn.close()
 
     @staticmethod
-    def get_user_by_id(user_id):
-        conn = get_db_connection()
-        try:
+    def get_user_by_id(user_id, conn=None):
+        with db_connection(conn) as conn:
             user = conn.execute('SELECT * FROM users WHERE id = ?', (user_id,)).fetchone()
             return dict(user) if user else None
+
+    @staticmethod
+    def get_profile(user_id, conn=None):
+        """Just id and username, served from the profile cache when possible"""
+        profile = _profiles.get(user_id)
+        if profile is None:
+            with db_connection(conn) as conn:
+                row = conn.execute('SELECT id, username FROM users WHERE id = ?', (user_id,)).fetchone()
+            if row is None:
+                return None
+            profile = dict(row)
+            _profiles.set(user_id, profile)
+        return dict(profile)
+
+    @staticmethod
+    def verify_password(user_id, password):
+        if not password:
+            return False
+        conn = get_db_connection()
+        try:
+            row = conn.execute('SELECT password_hash FROM users WHERE id = ?', (user_id,)).fetchone()
+            return bool(row) and bcrypt.checkpw(password.encode('utf-8'), row['password_hash'])
         finally:
             conn.close()
 
+    @staticmethod
+    def invalidate_profile(user_id):
+        _profiles.delete(user_id)
+
     @staticmethod
     def update_password(user_id, new_password):
         conn = get_db_connection()
@@ -84,6 +117,7 @@ class User:
             conn.commit()
         finally:
             conn.close()
+        User.invalidate_profile(user_id)
 
     @staticmethod
     def update_username(user_id, new_username):
@@ -107,6 +141,7 @@ class User:
             conn.commit()
         finally:
             conn.close()
+        User.invalidate_profile(user_id)
 
     @staticmethod
     def username_exists(username, exclude_user_id=None):
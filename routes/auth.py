@@ -3,6 +3,7 @@ from datetime import datetime, timedelta
 from flask import Blueprint, request, jsonify, session, render_template, redirect, url_for
 from models.user import User
 from models.transaction import Transaction
+from utils.sessions import revoke_user_sessions
 
 bp = Blueprint('auth', __name__, url_prefix='/auth')
 
@@ -141,7 +142,7 @@ def logout():
 def get_current_user():
     if 'user_id' in session:
         try:
-            user = User.get_user_by_id(session['user_id'])
+            user = User.get_profile(session['user_id'])
             if user:
                 return jsonify({'user': {'id': user['id'], 'username': user['username']}}), 200
             else:
@@ -193,14 +194,15 @@ def change_password():
         if not is_strong:
             return jsonify({'error': message}), 400
             
-        user = User.get_user_by_id(session['user_id'])
-        if not user:
+        if not User.get_profile(session['user_id']):
             return jsonify({'error': 'User not found'}), 404
             
-        if not User.verify_user(user['username'], current_password):
+        if not User.verify_password(session['user_id'], current_password):
             return jsonify({'error': 'Current password is incorrect'}), 400
             
         User.update_password(session['user_id'], new_password)
+        # Sign out every other device that still knows the old password
+        revoke_user_sessions(session['user_id'], keep_sid=session.sid)
         return jsonify({'message': 'Password updated successfully'}), 200
     except Exception as e:
         print(f"Change password error: {e}")
@@ -226,11 +228,10 @@ def change_username():
         if not re.match(r'^[a-zA-Z0-9_]+$', new_username):
             return jsonify({'error': 'Username can only contain letters, numbers, and underscores'}), 400
             
-        user = User.get_user_by_id(session['user_id'])
-        if not user:
+        if not User.get_profile(session['user_id']):
             return jsonify({'error': 'User not found'}), 404
             
-        if not User.verify_user(user['username'], current_password):
+        if not User.verify_password(session['user_id'], current_password):
             return jsonify({'error': 'Current password is incorrect'}), 400
             
         User.update_username(session['user_id'], new_username)
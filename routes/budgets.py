@@ -0,0 +1,60 @@
+import re
+from flask import Blueprint, request, jsonify, session
+from models.budget import Budget
+
+bp = Blueprint('budgets', __name__, url_prefix='/api/budgets')
+
+def require_login():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    return None
+
+@bp.route('', methods=['GET'])
+def get_budgets():
+    """All budgets with their spend for the current month"""
+    err = require_login()
+    if err:
+        return err
+    return jsonify(Budget.status(session['user_id']))
+
+@bp.route('', methods=['POST'])
+def set_budget():
+    """Create a budget for a category, or change the limit of an existing one"""
+    err = require_login()
+    if err:
+        return err
+    data = request.get_json()
+    for field in ['category', 'monthly_limit']:
+        if field not in data or not data[field]:
+            return jsonify({'error': f'Missing required field: {field}'}), 400
+    try:
+        budget_id = Budget.upsert(session['user_id'], data['category'], float(data['monthly_limit']))
+        return jsonify({'id': budget_id, 'message': 'Budget saved successfully'}), 201
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<int:budget_id>', methods=['DELETE'])
+def delete_budget(budget_id):
+    err = require_login()
+    if err:
+        return err
+    try:
+        deleted = Budget.delete(session['user_id'], budget_id)
+        if not deleted:
+            return jsonify({'error': 'Budget not found'}), 404
+        return jsonify({'message': 'Budget deleted successfully'}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/status', methods=['GET'])
+def get_budget_status():
+    """Budget status for ?month=YYYY-MM (default current month), read from spend counters only"""
+    err = require_login()
+    if err:
+        return err
+    month = request.args.get('month')
+    if month and not re.match(r'^\d{4}-\d{2}$', month):
+        return jsonify({'error': 'Month must be in YYYY-MM format'}), 400
+    return jsonify(Budget.status(session['user_id'], month))
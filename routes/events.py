@@ -0,0 +1,65 @@
+import json
+import os
+import queue
+import time
+from flask import Blueprint, Response, jsonify, session, stream_with_context
+from models.transaction import Transaction
+from utils.events import broker, ConnectionLimitError
+
+bp = Blueprint('events', __name__, url_prefix='/api/events')
+
+# A comment line keeps proxies from closing the stream and detects dead clients
+SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+# Streams are recycled periodically so threads are freed; EventSource reconnects on its own
+SSE_MAX_STREAM_SECONDS = int(os.environ.get('SSE_MAX_STREAM_SECONDS', 300))
+
+def format_sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@bp.route('', methods=['GET'])
+def stream_events():
+    """Server-sent events stream of transaction changes and fresh summaries for the current user"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    user_id = session['user_id']
+    try:
+        q = broker.subscribe(user_id)
+    except ConnectionLimitError as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': str(SSE_HEARTBEAT_SECONDS)}
+
+    def generate():
+        try:
+            yield f"retry: {SSE_HEARTBEAT_SECONDS * 1000}\n\n"
+            deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+            while time.monotonic() < deadline:
+                try:
+                    event, payload = q.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": heartbeat\n\n"
+                    continue
+
+                # Collapse a burst of writes into a single changes/summary push
+                seq = payload.get('seq', 0)
+                while True:
+                    try:
+                        _, queued = q.get_nowait()
+                        seq = max(seq, queued.get('seq', 0))
+                    except queue.Empty:
+                        break
+
+                yield format_sse('changes', {'seq': seq})
+                yield format_sse('summary', {
+                    'summary': Transaction.summary(user_id),
+                    'current_month_summary': Transaction.current_month_summary(user_id)
+                })
+        finally:
+            broker.unsubscribe(user_id, q)
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Also release the slot if the client disconnects before the stream starts
+    response.call_on_close(lambda: broker.unsubscribe(user_id, q))
+    return response
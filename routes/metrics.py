@@ -0,0 +1,11 @@
+from flask import Blueprint, jsonify, session
+from utils import metrics
+
+bp = Blueprint('metrics', __name__, url_prefix='/api/metrics')
+
+@bp.route('', methods=['GET'])
+def get_metrics():
+    """Counters of the worker process that served the request"""
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    return jsonify(metrics.snapshot())
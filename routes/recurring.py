@@ -0,0 +1,61 @@
+from flask import Blueprint, request, jsonify, session
+from models.recurring import RecurringRule, FREQUENCIES
+
+bp = Blueprint('recurring', __name__, url_prefix='/api/recurring')
+
+def require_login():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Authentication required'}), 401
+    return None
+
+@bp.route('', methods=['GET'])
+def get_rules():
+    err = require_login()
+    if err:
+        return err
+    return jsonify(RecurringRule.get_all(session['user_id']))
+
+@bp.route('', methods=['POST'])
+def add_rule():
+    err = require_login()
+    if err:
+        return err
+    data = request.get_json()
+    for field in ['amount', 'category', 'type', 'frequency', 'start_date']:
+        if field not in data or not data[field]:
+            return jsonify({'error': f'Missing required field: {field}'}), 400
+    if data['type'] not in ['income', 'expense']:
+        return jsonify({'error': 'Type must be either income or expense'}), 400
+    if data['frequency'] not in FREQUENCIES:
+        return jsonify({'error': f"Frequency must be one of: {', '.join(FREQUENCIES)}"}), 400
+    try:
+        rule_id = RecurringRule.create(
+            session['user_id'],
+            float(data['amount']),
+            data['category'],
+            data['type'],
+            data['frequency'],
+            data['start_date'],
+            data.get('end_date'),
+            data.get('description', '')
+        )
+        # Catch up on occurrences that are already due (e.g. a start date in the past)
+        created = RecurringRule.materialize_due(user_id=session['user_id'], rule_id=rule_id)
+        return jsonify({'id': rule_id, 'created_transactions': created, 'message': 'Recurring transaction added successfully'}), 201
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/<int:rule_id>', methods=['DELETE'])
+def delete_rule(rule_id):
+    err = require_login()
+    if err:
+        return err
+    try:
+        deleted = RecurringRule.delete(session['user_id'], rule_id)
+        if not deleted:
+            return jsonify({'error': 'Recurring transaction not found'}), 404
+        return jsonify({'message': 'Recurring transaction deleted successfully'}), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify, session, send_file
 from models.transaction import Transaction
+from models.budget import Budget
+from utils.sharding import user_db_connection
 import io
-import xlsxwriter
 from datetime import datetime
 
 bp = Blueprint('transactions', __name__, url_prefix='/api/transactions')
@@ -16,7 +17,29 @@ def get_transactions():
     err = require_login()
     if err:
         return err
-    return jsonify(Transaction.get_all(session['user_id']))
+    # Optional ?start_date=&end_date= (YYYY-MM-DD); archived rows are only read when the range needs them
+    start_date = request.args.get('start_date')
+    end_date = request.args.get('end_date')
+    with user_db_connection(session['user_id']) as conn:
+        # Read the sequence first so changes racing with this read are replayed by the next sync
+        seq = Transaction.current_seq(session['user_id'], conn=conn)
+        response = jsonify(Transaction.get_all(session['user_id'], start_date, end_date, conn=conn))
+    response.headers['X-Sync-Seq'] = str(seq)
+    return response
+
+@bp.route('/changes', methods=['GET'])
+def get_transaction_changes():
+    """Return only the rows changed or deleted since the client's last sync"""
+    err = require_login()
+    if err:
+        return err
+    since = request.args.get('since', type=int)
+    if since is None or since < 0:
+        return jsonify({'error': 'Query parameter since must be a non-negative integer'}), 400
+    try:
+        return jsonify(Transaction.changes_since(session['user_id'], since))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @bp.route('', methods=['POST'])
 def add_transaction():
@@ -38,7 +61,11 @@ def add_transaction():
             data['date'],
             data.get('description', '')
         )
-        return jsonify({'id': transaction_id, 'message': 'Transaction added successfully'}), 201
+        return jsonify({
+            'id': transaction_id,
+            'message': 'Transaction added successfully',
+            'budget': Budget.check(session['user_id'], data['category'], data['date']) if data['type'] == 'expense' else None
+        }), 201
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -98,7 +125,10 @@ def update_transaction(transaction_id):
         if not updated:
             return jsonify({'error': 'Transaction not found'}), 404
         
-        return jsonify({'message': 'Transaction updated successfully'}), 200
+        return jsonify({
+            'message': 'Transaction updated successfully',
+            'budget': Budget.check(session['user_id'], data['category'], data['date']) if data['type'] == 'expense' else None
+        }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -115,28 +145,17 @@ def download_filtered_transactions():
         start_date = data.get('start_date')
         end_date = data.get('end_date')
         
-        # Get all transactions for the user
-        all_transactions = Transaction.get_all(session['user_id'])
+        # Normalize the dates so they compare correctly with the stored YYYY-MM-DD strings
+        if start_date:
+            start_date = datetime.strptime(start_date, '%Y-%m-%d').date().isoformat()
+        if end_date:
+            end_date = datetime.strptime(end_date, '%Y-%m-%d').date().isoformat()
         
-        # Apply date filtering
-        filtered_transactions = []
-        for transaction in all_transactions:
-            transaction_date = datetime.strptime(transaction['date'], '%Y-%m-%d').date()
-            
-            # Check if transaction falls within date range
-            include = True
-            if start_date:
-                start_date_obj = datetime.strptime(start_date, '%Y-%m-%d').date()
-                if transaction_date < start_date_obj:
-                    include = False
-            
-            if end_date and include:
-                end_date_obj = datetime.strptime(end_date, '%Y-%m-%d').date()
-                if transaction_date > end_date_obj:
-                    include = False
-            
-            if include:
-                filtered_transactions.append(transaction)
+        # Filter in SQL; the archive is only read when the range reaches back into it
+        filtered_transactions = Transaction.get_all(session['user_id'], start_date, end_date)
+        
+        # Imported on first export so workers don't pay for it at boot
+        import xlsxwriter
         
         # Create Excel file in memory
         output = io.BytesIO()
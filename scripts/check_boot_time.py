@@ -0,0 +1,67 @@
+"""Fail if importing the app (what every new gunicorn worker does) exceeds an import-time budget.
+
+Usage: python scripts/check_boot_time.py [--budget-ms 500] [--runs 3] [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from utils.startup import STARTUP_DONE_ENV  # noqa: E402
+
+# Modules that must load on first use only, never while a worker boots
+LAZY_MODULES = ('xlsxwriter',)
+
+
+def measure_imports():
+    """Run `python -X importtime -c "import app"` like a forked worker; return {module: (self_us, cumulative_us)}"""
+    env = dict(os.environ, **{STARTUP_DONE_ENV: 'true', 'SCHEDULER_ENABLED': 'false'})
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing app failed:\n{result.stderr}")
+    timings = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        # Top-level imports have no indentation; keep the first (outermost) entry per module
+        timings.setdefault(name.strip(), (int(self_us), int(cumulative_us)))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=float(os.environ.get('BOOT_IMPORT_BUDGET_MS', 500)))
+    parser.add_argument('--runs', type=int, default=3, help="best of N runs, to smooth out noise")
+    parser.add_argument('--top', type=int, default=15, help="slowest imports to list")
+    args = parser.parse_args()
+
+    runs = [measure_imports() for _ in range(max(args.runs, 1))]
+    best = min(runs, key=lambda timings: timings['app'][1])
+    total_ms = best['app'][1] / 1000
+
+    print(f"Slowest imports (cumulative, best of {len(runs)} runs):")
+    for name, (_, cumulative_us) in sorted(best.items(), key=lambda item: item[1][1], reverse=True)[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in best]
+    if eager:
+        print(f"FAIL: imported at boot but should be lazy: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"FAIL: importing app took {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+        failed = True
+    else:
+        print(f"OK: importing app took {total_ms:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Move a user between shards in a scratch directory and check that ids stay unique afterwards.
+
+Usage: python scripts/check_shard_moves.py
+"""
+import itertools
+import os
+import sys
+import tempfile
+from datetime import date
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+SCRATCH = tempfile.mkdtemp(prefix='shard-moves-')
+os.environ.update({
+    'DATABASE_URL': f"sqlite:///{os.path.join(SCRATCH, 'finance.db')}",
+    'SHARD_COUNT': '3',
+    'SHARD_DIR': os.path.join(SCRATCH, 'shards'),
+    'SHARD_ROUTE_CACHE_SECONDS': '0',
+    'SCHEDULER_ENABLED': 'false',
+})
+
+from utils.db import init_db, migrate_db  # noqa: E402
+from utils.sharding import (  # noqa: E402
+    SHARD_ID_RANGE, move_users, prepare_shards, shard_for_user, stable_shard
+)
+from models.budget import Budget  # noqa: E402
+from models.recurring import RecurringRule  # noqa: E402
+from models.transaction import Transaction  # noqa: E402
+
+# Every call adds a new budget rather than updating an earlier one
+_budget_names = itertools.count()
+
+
+def user_on(shard, exclude=()):
+    return next(user_id for user_id in range(1, 1000) if stable_shard(user_id) == shard and user_id not in exclude)
+
+
+def add_rows(user_id):
+    """One transaction, recurring rule and budget; returns {table: id}"""
+    return {
+        'transactions': Transaction.create(user_id, 10, 'Food', 'expense', '2024-01-01'),
+        'recurring_rules': RecurringRule.create(user_id, 5, 'Rent', 'expense', 'monthly', '2024-01-01'),
+        'budgets': Budget.upsert(user_id, f'Budget {next(_budget_names)}', 100),
+    }
+
+
+def main():
+    init_db()
+    migrate_db()
+    prepare_shards()
+    failures = []
+
+    mover, stayer, neighbour = user_on(1), user_on(0), user_on(1, exclude=(user_on(1),))
+    for user_id in (mover, stayer, neighbour):
+        add_rows(user_id)
+    # A delete leaves a tombstone whose id must not be reused on either shard
+    Transaction.delete(mover, add_rows(mover)['transactions'])
+    for rule in RecurringRule.get_all(mover):
+        RecurringRule.materialize_due(today=date(2024, 3, 1), user_id=mover, rule_id=rule['id'])
+
+    for target in (0, 1):
+        source, synced = shard_for_user(mover), Transaction.current_seq(mover)
+        if move_users([(mover, source, target)], wait=False) != 1:
+            failures.append(f"moving user {mover} from shard {source} to {target} failed")
+            break
+        if not Transaction.changes_since(mover, synced)['reset']:
+            failures.append(f"clients synced before the move to shard {target} are not reset")
+        rule_ids = {rule['id'] for rule in RecurringRule.get_all(mover)}
+        occurrences = [row for row in Transaction.get_all(mover) if row['recurring_rule_id']]
+        if not occurrences or any(row['recurring_rule_id'] not in rule_ids for row in occurrences):
+            failures.append(f"recurring occurrences lost their rule after moving to shard {target}")
+        ids = {user_id: add_rows(user_id) for user_id in (mover, stayer, neighbour)}
+        for table in ids[mover]:
+            allocated = [rows[table] for rows in ids.values()]
+            if len(set(allocated)) != len(allocated):
+                failures.append(f"{table} ids collide after moving to shard {target}: {allocated}")
+            for user_id, rows in ids.items():
+                shard = shard_for_user(user_id)
+                if rows[table] // SHARD_ID_RANGE != shard + 1:
+                    failures.append(f"{table} id {rows[table]} for user {user_id} is outside shard {shard}'s range")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    if not failures:
+        print(f"OK: ids stay in their shard's range after moving user {mover} between shards")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,6 +1,6 @@
 // Global variables to store application state and data
 let transactions = [], filteredTransactions = [], pieChart = null, barChart = null, summaryData = null, currentMonthSummary = null, currentUser = null;
-let currentChartType = 'expense', currentPage = 1, totalPages = 1;
+let currentChartType = 'expense', currentPage = 1, totalPages = 1, syncSeq = 0, eventSource = null;
 const itemsPerPage = 5, dateFilter = { startDate: null, endDate: null };
 
 async function checkUserAuth() {
@@ -22,6 +22,7 @@ async function checkUserAuth() {
 }
 
 async function logout() {
+    disconnectEvents();
     try {
         const response = await fetch('/auth/logout', { method: 'POST' });
         if (response.ok) window.location.href = '/login';
@@ -50,7 +51,11 @@ const toast = document.getElementById('toast');
 
 // Application initialization - this function runs when the DOM is fully loaded
 document.addEventListener('DOMContentLoaded', async () => {
-    if (!await checkUserAuth()) return;
+    const bootstrap = readBootstrapData();
+    if (bootstrap) {
+        currentUser = bootstrap.user;
+        document.getElementById('username').textContent = currentUser.username;
+    } else if (!await checkUserAuth()) return;
     dateInput.value = new Date().toISOString().split('T')[0];
     const startDateInput = document.getElementById('start-date');
     const endDateInput = document.getElementById('end-date');
@@ -63,13 +68,88 @@ document.addEventListener('DOMContentLoaded', async () => {
     dateFilter.startDate = startDateInput.value;
     dateFilter.endDate = endDateInput.value;
     setupEventListeners();
-    loadTransactions();
-    loadSummary();
-    loadCurrentMonthSummary(); // Load current month summary independently
     initializeTimeframeSummary();
+    if (bootstrap) {
+        // Render straight from the server-embedded payload, no startup round trips
+        syncSeq = bootstrap.seq;
+        setTransactions(bootstrap.transactions);
+        applySummary(bootstrap.summary);
+        currentMonthSummary = bootstrap.current_month_summary;
+        updateMainSummaryCards(currentMonthSummary);
+        // Only the newest page was embedded; fetch the rest in the background
+        if (bootstrap.has_more) {
+            loadTransactions().then(() => {
+                if (dateFilter.startDate || dateFilter.endDate) calculateFilteredSummary();
+            });
+        }
+    } else {
+        loadTransactions();
+        loadSummary();
+        loadCurrentMonthSummary(); // Load current month summary independently
+    }
     updateCategories();
+    connectEvents();
+    // Hidden tabs drop their stream so idle dashboards cost the server nothing
+    document.addEventListener('visibilitychange', () => {
+        if (document.hidden) {
+            disconnectEvents();
+        } else {
+            connectEvents();
+            syncChanges();
+        }
+    });
 });
 
+function connectEvents() {
+    /**
+     * Subscribe to server-sent events so changes from other tabs and devices
+     * (and fresh summaries) are pushed instead of polled
+     */
+    if (!window.EventSource || eventSource) return;
+    eventSource = new EventSource('/api/events');
+    eventSource.addEventListener('changes', e => {
+        const data = JSON.parse(e.data);
+        if (data.seq > syncSeq) syncChanges();
+    });
+    eventSource.addEventListener('summary', e => {
+        const data = JSON.parse(e.data);
+        applySummary(data.summary);
+        currentMonthSummary = data.current_month_summary;
+        updateMainSummaryCards(currentMonthSummary);
+    });
+}
+
+function disconnectEvents() {
+    if (eventSource) {
+        eventSource.close();
+        eventSource = null;
+    }
+}
+
+function eventsConnected() {
+    return eventSource !== null && eventSource.readyState === EventSource.OPEN;
+}
+
+async function refreshAfterWrite() {
+    // Patch the list from the delta feed; summaries arrive over the event stream when it is open
+    await syncChanges();
+    if (!eventsConnected()) {
+        await loadSummary();
+        await loadCurrentMonthSummary();
+    }
+}
+
+function readBootstrapData() {
+    // Initial dashboard data embedded by the server in index.html (absent when bootstrap mode is off)
+    const el = document.getElementById('bootstrap-data');
+    if (!el) return null;
+    try {
+        return JSON.parse(el.textContent);
+    } catch {
+        return null;
+    }
+}
+
 function initializeTimeframeSummary() {
     ['timeframe-income', 'timeframe-expenses', 'timeframe-balance'].forEach(id => {
         const el = document.getElementById(id);
@@ -162,13 +242,12 @@ async function handleAddTransaction(e) {
         });
         const result = await response.json();
         if (response.ok) {
-            showToast('Transaction added successfully!', 'success');
+            const budgetAlert = budgetAlertMessage(result.budget);
+            showToast(budgetAlert || 'Transaction added successfully!', budgetAlert ? 'error' : 'success');
             form.reset();
             dateInput.value = new Date().toISOString().split('T')[0];
             categorySelect.innerHTML = '<option value="">Select Category</option>';
-            await loadTransactions();
-            await loadSummary();
-            await loadCurrentMonthSummary(); // Refresh current month summary
+            await refreshAfterWrite();
         } else {
             showToast(result.error || 'Failed to add transaction', 'error');
         }
@@ -182,15 +261,45 @@ async function handleAddTransaction(e) {
 async function loadTransactions() {
     try {
         const response = await fetch('/api/transactions');
-        transactions = await response.json();
-        applyCurrentFilter();
-        renderTransactions();
-        updateFilterStatus();
+        const list = await response.json();
+        syncSeq = parseInt(response.headers.get('X-Sync-Seq'), 10) || 0;
+        setTransactions(list);
     } catch {
         showToast('Failed to load transactions', 'error');
     }
 }
 
+async function syncChanges() {
+    /**
+     * Fetch only the rows changed since the last sync and patch the local list
+     * instead of re-downloading every transaction
+     */
+    try {
+        const response = await fetch(`/api/transactions/changes?since=${syncSeq}`);
+        if (!response.ok) return loadTransactions();
+        const changes = await response.json();
+        if (changes.reset) {
+            syncSeq = changes.seq;
+            return setTransactions(changes.changed);
+        }
+        const byId = new Map(transactions.map(t => [t.id, t]));
+        changes.deleted.forEach(id => byId.delete(id));
+        changes.changed.forEach(t => byId.set(t.id, t));
+        const list = [...byId.values()].sort((a, b) => b.date.localeCompare(a.date) || b.id - a.id);
+        syncSeq = changes.seq;
+        setTransactions(list);
+    } catch {
+        showToast('Failed to refresh transactions', 'error');
+    }
+}
+
+function setTransactions(list) {
+    transactions = list;
+    applyCurrentFilter();
+    renderTransactions();
+    updateFilterStatus();
+}
+
 function applyCurrentFilter() {
     /**
      * Apply date range filtering to transactions based on current filter settings
@@ -383,9 +492,7 @@ async function deleteTransaction(id) {
         const result = await response.json();
         if (response.ok) {
             showToast('Transaction deleted successfully!', 'success');
-            await loadTransactions();
-            await loadSummary();
-            await loadCurrentMonthSummary(); // Refresh current month summary
+            await refreshAfterWrite();
         } else {
             showToast(result.error || 'Failed to delete transaction', 'error');
         }
@@ -423,26 +530,7 @@ async function loadSummary() {
         // Fetch summary data from the API endpoint
         const response = await fetch('/api/summary');
         // Parse and store the summary data globally for chart operations
-        summaryData = await response.json();
-        
-        // Initialize filtered transactions if not done already
-        // This ensures we have data to work with for filtering operations
-        if (filteredTransactions.length === 0 && transactions.length > 0) {
-            filteredTransactions = [...transactions];  // Copy all transactions to filtered array
-        }
-        
-        // Update summary displays based on whether date filters are active
-        if (dateFilter.startDate || dateFilter.endDate) {
-            // If date filters are active, calculate summary from filtered data for charts only
-            calculateFilteredSummary();
-        } else {
-            // If no filters are active, use the server-provided summary data for charts and timeframe
-            updateCharts(summaryData);        // Update the chart visualizations
-            updateTimeframeSummary(summaryData); // Update timeframe summary bar
-        }
-        
-        // Note: Main summary cards are updated independently by loadCurrentMonthSummary()
-        
+        applySummary(await response.json());
     } catch (error) {
         // Handle any errors that occur during the fetch operation
         console.error('Error loading summary:', error);  // Log for debugging
@@ -450,6 +538,31 @@ async function loadSummary() {
     }
 }
 
+function applySummary(summary) {
+    /**
+     * Store the server summary and refresh charts and the timeframe bar
+     */
+    summaryData = summary;
+    
+    // Initialize filtered transactions if not done already
+    // This ensures we have data to work with for filtering operations
+    if (filteredTransactions.length === 0 && transactions.length > 0) {
+        filteredTransactions = [...transactions];  // Copy all transactions to filtered array
+    }
+    
+    // Update summary displays based on whether date filters are active
+    if (dateFilter.startDate || dateFilter.endDate) {
+        // If date filters are active, calculate summary from filtered data for charts only
+        calculateFilteredSummary();
+    } else {
+        // If no filters are active, use the server-provided summary data for charts and timeframe
+        updateCharts(summaryData);        // Update the chart visualizations
+        updateTimeframeSummary(summaryData); // Update timeframe summary bar
+    }
+    
+    // Note: Main summary cards are updated independently by loadCurrentMonthSummary()
+}
+
 function calculateFilteredSummary() {
     const dataToCalculate = filteredTransactions;
     
@@ -818,6 +931,15 @@ function showToast(message, type) {
     }, 3000);
 }
 
+function budgetAlertMessage(budget) {
+    // Warning text when a write pushes its category close to or over the monthly budget
+    if (!budget || budget.status === 'ok') return null;
+    const usage = `₹${budget.spent.toFixed(2)} of ₹${budget.monthly_limit.toFixed(2)}`;
+    return budget.status === 'over'
+        ? `Saved, but over budget for ${budget.category}: ${usage}`
+        : `Saved. ${budget.category} budget almost used: ${usage}`;
+}
+
 // Utility function to format currency
 function formatCurrency(amount) {
     return new Intl.NumberFormat('en-IN', {
@@ -1063,11 +1185,10 @@ async function handleEditTransaction(e) {
         const result = await response.json();
         
         if (response.ok) {
-            showToast('Transaction updated successfully!', 'success');
+            const budgetAlert = budgetAlertMessage(result.budget);
+            showToast(budgetAlert || 'Transaction updated successfully!', budgetAlert ? 'error' : 'success');
             closeEditModal();
-            await loadTransactions();
-            await loadSummary();
-            await loadCurrentMonthSummary(); // Refresh current month summary
+            await refreshAfterWrite();
         } else {
             showToast(result.error || 'Failed to update transaction', 'error');
         }
@@ -0,0 +1,115 @@
+import hashlib
+import mimetypes
+import os
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+from utils.compression import brotli, choose_encoding, compress
+
+# Fingerprinted asset URLs never change content, so browsers may keep them for a year
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+PRECOMPRESS_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.txt', '.html')
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+# (path, mtime) -> short content hash, so each file is hashed once per change
+_digest_cache = {}
+
+
+def asset_digest(filename, static_folder=None):
+    """Return a short content hash for a file in the static folder"""
+    static_folder = static_folder or current_app.static_folder
+    path = safe_join(static_folder, filename)
+    if not path or not os.path.isfile(path):
+        return None
+    key = (path, os.path.getmtime(path))
+    digest = _digest_cache.get(key)
+    if digest is None:
+        with open(path, 'rb') as f:
+            digest = hashlib.md5(f.read()).hexdigest()[:12]
+        _digest_cache[key] = digest
+    return digest
+
+
+def asset_url(filename):
+    """url_for('static') with a content-hash query parameter for cache busting"""
+    digest = asset_digest(filename)
+    if digest:
+        return url_for('static', filename=filename, v=digest)
+    return url_for('static', filename=filename)
+
+
+def precompress_static(static_folder):
+    """Write .gz (and .br when brotli is installed) siblings for text assets that are missing or stale"""
+    encodings = ['gzip'] + (['br'] if brotli is not None else [])
+    written = 0
+    for root, _, files in os.walk(static_folder):
+        for name in files:
+            if not name.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            source = os.path.join(root, name)
+            source_mtime = os.path.getmtime(source)
+            data = None
+            for encoding in encodings:
+                target = source + ENCODING_SUFFIXES[encoding]
+                if os.path.exists(target) and os.path.getmtime(target) >= source_mtime:
+                    continue
+                if data is None:
+                    with open(source, 'rb') as f:
+                        data = f.read()
+                tmp = f'{target}.{os.getpid()}.tmp'
+                with open(tmp, 'wb') as f:
+                    f.write(compress(data, encoding))
+                os.replace(tmp, target)
+                written += 1
+    return written
+
+
+def _precompressed_variant(static_folder, filename):
+    """Return (encoding, variant filename) for a fresh precompressed copy the client accepts"""
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if not encoding:
+        return None, None
+    source = safe_join(static_folder, filename)
+    if not source or not os.path.isfile(source):
+        return None, None
+    variant = source + ENCODING_SUFFIXES[encoding]
+    if not os.path.isfile(variant) or os.path.getmtime(variant) < os.path.getmtime(source):
+        return None, None
+    return encoding, filename + ENCODING_SUFFIXES[encoding]
+
+
+def serve_static(filename):
+    """Static file view that prefers precompressed files and marks fingerprinted URLs immutable"""
+    static_folder = current_app.static_folder
+    encoding, variant = _precompressed_variant(static_folder, filename)
+    if variant:
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = send_from_directory(static_folder, variant, mimetype=mimetype)
+        response.headers['Content-Encoding'] = encoding
+    else:
+        response = current_app.send_static_file(filename)
+    response.vary.add('Accept-Encoding')
+
+    version = request.args.get('v')
+    if version and version == asset_digest(filename, static_folder):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+        response.headers.pop('Expires', None)
+    else:
+        # Unversioned URLs must be revalidated so they never serve stale code
+        response.cache_control.no_cache = True
+    return response
+
+
+def init_assets(app):
+    """Swap in the fingerprint-aware static view and expose asset_url() to templates"""
+    app.view_functions['static'] = serve_static
+    app.add_template_global(asset_url)
+
+
+if __name__ == '__main__':
+    folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+    count = precompress_static(folder)
+    print(f"Precompressed {count} static file(s) in {folder}")
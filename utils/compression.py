@@ -0,0 +1,94 @@
+import gzip
+import os
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Responses smaller than this are not worth the CPU cost of compressing
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html',
+    'text/css',
+    'text/plain',
+    'text/javascript',
+    'application/javascript',
+    'application/json',
+    'image/svg+xml',
+}
+
+
+def _accepted_encodings(accept_encoding):
+    """Encodings listed in an Accept-Encoding header, minus those rejected with q=0"""
+    accepted = set()
+    for part in (accept_encoding or '').split(','):
+        coding, *params = [item.strip() for item in part.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            accepted.add(coding.lower())
+    return accepted
+
+
+def choose_encoding(accept_encoding):
+    """Pick the best content encoding the client accepts ('br', 'gzip' or None)"""
+    accepted = _accepted_encodings(accept_encoding)
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(data, encoding):
+    """Compress raw bytes with the given content encoding"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(COMPRESS_LEVEL, 11))
+    return gzip.compress(data, compresslevel=COMPRESS_LEVEL)
+
+
+def compress_response(response):
+    """after_request hook: compress buffered text responses above the size threshold"""
+    response.vary.add('Accept-Encoding')
+
+    # Streams (SSE, file downloads) and already-encoded bodies are passed through
+    if (response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.status_code < 200
+            or response.status_code in (204, 304)
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'))
+    if not encoding:
+        return response
+
+    data = response.get_data()
+    if len(data) < COMPRESS_MIN_SIZE:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    if response.headers.get('ETag'):
+        # The compressed body is a different representation than the plain one
+        etag, weak = response.get_etag()
+        response.set_etag(f'{etag}-{encoding}', weak=weak)
+    return response
+
+
+def init_compression(app):
+    """Register response compression on the Flask app"""
+    app.after_request(compress_response)
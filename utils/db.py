@@ -1,5 +1,6 @@
 import sqlite3
 import os
+from contextlib import contextmanager
 
 DATABASE = os.environ.get('DATABASE_URL', 'sqlite:///finance.db').replace('sqlite:///', '')
 
@@ -18,15 +19,30 @@ def reset_database():
     except Exception as e:
         print(f"Error resetting database: {e}")
 
-def init_db():
-    """Initialize the database with required tables"""
+def init_db(path=None):
+    """Initialize the database (or a shard file, when path is given) with required tables"""
+    path = path or DATABASE
+    conn = None
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = sqlite3.connect(path)
         cursor = conn.cursor()
         
         # Drop existing tables if they exist (for clean slate)
+        cursor.execute('DROP TABLE IF EXISTS sessions')
+        cursor.execute('DROP TABLE IF EXISTS archive_state')
+        cursor.execute('DROP TABLE IF EXISTS monthly_aggregates')
+        cursor.execute('DROP TABLE IF EXISTS transactions_archive')
+        cursor.execute('DROP TABLE IF EXISTS user_shards')
+        cursor.execute('DROP TABLE IF EXISTS category_spend')
+        cursor.execute('DROP TABLE IF EXISTS budgets')
+        cursor.execute('DROP TABLE IF EXISTS job_leases')
+        cursor.execute('DROP TABLE IF EXISTS recurring_rules')
+        cursor.execute('DROP TABLE IF EXISTS event_notifications')
+        cursor.execute('DROP TABLE IF EXISTS transaction_tombstones')
+        cursor.execute('DROP TABLE IF EXISTS sync_state')
         cursor.execute('DROP TABLE IF EXISTS transactions')
         cursor.execute('DROP TABLE IF EXISTS users')
+        cursor.execute('PRAGMA user_version = 0')
         
         # Create users table with improved constraints
         cursor.execute('''
@@ -64,7 +80,7 @@ def init_db():
         cursor.execute('CREATE INDEX idx_users_email ON users(email)')
         
         conn.commit()
-        print(f"Database tables created successfully at: {DATABASE}")
+        print(f"Database tables created successfully at: {path}")
         
     except Exception as e:
         print(f"Error initializing database: {e}")
@@ -73,16 +89,261 @@ def init_db():
         if conn:
             conn.close()
 
-def get_db_connection():
+    # Bring the fresh baseline schema up to the latest version
+    migrate_db(path)
+
+def _migration_change_tracking(cursor):
+    """Per-user change sequence numbers and delete tombstones for delta sync"""
+    cursor.execute('ALTER TABLE transactions ADD COLUMN seq INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('''
+        CREATE TABLE sync_state (
+            user_id INTEGER PRIMARY KEY,
+            seq INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE transaction_tombstones (
+            transaction_id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            seq INTEGER NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX idx_transactions_user_seq ON transactions(user_id, seq)')
+    cursor.execute('CREATE INDEX idx_tombstones_user_seq ON transaction_tombstones(user_id, seq)')
+
+def _migration_event_notifications(cursor):
+    """Short-lived notify table used to fan events out across worker processes"""
+    cursor.execute('''
+        CREATE TABLE event_notifications (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            origin INTEGER NOT NULL,
+            created_at REAL NOT NULL
+        )
+    ''')
+
+def _migration_recurring_rules(cursor):
+    """Recurring transaction rules and scheduler job leases"""
+    cursor.execute('''
+        CREATE TABLE recurring_rules (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount REAL NOT NULL CHECK (amount > 0),
+            category TEXT NOT NULL,
+            type TEXT NOT NULL CHECK (type IN ('income', 'expense')),
+            description TEXT,
+            frequency TEXT NOT NULL CHECK (frequency IN ('daily', 'weekly', 'monthly', 'yearly')),
+            start_date TEXT NOT NULL,
+            end_date TEXT,
+            next_index INTEGER NOT NULL DEFAULT 0,
+            next_date TEXT NOT NULL,
+            active INTEGER NOT NULL DEFAULT 1,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('CREATE INDEX idx_recurring_rules_due ON recurring_rules(active, next_date)')
+    cursor.execute('CREATE INDEX idx_recurring_rules_user_id ON recurring_rules(user_id)')
+    # Each rule materializes at most one transaction per date, which makes scheduler runs idempotent
+    cursor.execute('ALTER TABLE transactions ADD COLUMN recurring_rule_id INTEGER')
+    cursor.execute('''
+        CREATE UNIQUE INDEX idx_transactions_recurring_occurrence
+        ON transactions(recurring_rule_id, date) WHERE recurring_rule_id IS NOT NULL
+    ''')
+    cursor.execute('''
+        CREATE TABLE job_leases (
+            name TEXT PRIMARY KEY,
+            owner TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+
+def _migration_budgets(cursor):
+    """Category budgets and running monthly spend counters (backfilled from existing expenses)"""
+    cursor.execute('''
+        CREATE TABLE budgets (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            monthly_limit REAL NOT NULL CHECK (monthly_limit > 0),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (user_id, category),
+            FOREIGN KEY (user_id) REFERENCES users (id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE category_spend (
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            month TEXT NOT NULL,
+            spent REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, category, month)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        INSERT INTO category_spend (user_id, category, month, spent)
+        SELECT user_id, category, substr(date, 1, 7), SUM(amount)
+        FROM transactions
+        WHERE type = 'expense'
+        GROUP BY user_id, category, substr(date, 1, 7)
+    ''')
+
+def _migration_shard_catalog(cursor):
+    """Directory of which shard file holds each user's data (used when SHARD_COUNT > 0)"""
+    cursor.execute('''
+        CREATE TABLE user_shards (
+            user_id INTEGER PRIMARY KEY,
+            shard INTEGER NOT NULL,
+            moving INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+
+def _migration_transaction_archive(cursor):
+    """Cold table for old transactions plus the per-month aggregates that summaries read instead"""
+    cursor.execute('''
+        CREATE TABLE transactions_archive (
+            id INTEGER PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            amount REAL NOT NULL CHECK (amount > 0),
+            category TEXT NOT NULL,
+            type TEXT NOT NULL CHECK (type IN ('income', 'expense')),
+            date TEXT NOT NULL,
+            description TEXT,
+            created_at TIMESTAMP,
+            seq INTEGER NOT NULL DEFAULT 0,
+            recurring_rule_id INTEGER
+        )
+    ''')
+    cursor.execute('CREATE INDEX idx_transactions_archive_user_date ON transactions_archive(user_id, date)')
+    cursor.execute('''
+        CREATE TABLE monthly_aggregates (
+            user_id INTEGER NOT NULL,
+            month TEXT NOT NULL,
+            type TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, month, type, category)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('''
+        CREATE TABLE archive_state (
+            user_id INTEGER PRIMARY KEY,
+            archived_before TEXT NOT NULL
+        )
+    ''')
+
+def _migration_sessions(cursor):
+    """Server-side session store (the cookie only holds the session id)"""
+    cursor.execute('''
+        CREATE TABLE sessions (
+            id TEXT PRIMARY KEY,
+            user_id INTEGER,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX idx_sessions_user_id ON sessions(user_id)')
+    cursor.execute('CREATE INDEX idx_sessions_expires_at ON sessions(expires_at)')
+
+def _migration_incremental_vacuum(cursor):
+    """Switch to incremental auto-vacuum so maintenance can hand free pages back to the OS"""
+    # Changing auto_vacuum on an existing database only takes effect after a full VACUUM
+    cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+    cursor.execute('VACUUM')
+
+# VACUUM cannot run inside a transaction
+_migration_incremental_vacuum.transactional = False
+
+def _migration_tombstone_retention(cursor):
+    """Timestamp tombstones so old ones can be pruned, and remember how far each user's were pruned"""
+    cursor.execute('ALTER TABLE transaction_tombstones ADD COLUMN deleted_at REAL')
+    cursor.execute("UPDATE transaction_tombstones SET deleted_at = CAST(strftime('%s', 'now') AS REAL)")
+    cursor.execute('ALTER TABLE sync_state ADD COLUMN pruned_seq INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('CREATE INDEX idx_tombstones_deleted_at ON transaction_tombstones(deleted_at)')
+
+# Schema migrations applied in order on top of the init_db() baseline.
+# PRAGMA user_version records how many have run; only ever append to this list.
+MIGRATIONS = [
+    _migration_change_tracking,
+    _migration_event_notifications,
+    _migration_recurring_rules,
+    _migration_budgets,
+    _migration_shard_catalog,
+    _migration_transaction_archive,
+    _migration_sessions,
+    _migration_incremental_vacuum,
+    _migration_tombstone_retention,
+]
+
+def _apply_outside_transaction(conn, version, migration):
+    """Run a migration that cannot be wrapped in a transaction (e.g. VACUUM).
+
+    Two processes may both run it if they race, so such migrations must be idempotent.
+    """
+    if conn.execute('PRAGMA user_version').fetchone()[0] >= version:
+        return
+    migration(conn.cursor())
+    conn.execute('BEGIN IMMEDIATE')
+    if conn.execute('PRAGMA user_version').fetchone()[0] < version:
+        conn.execute(f'PRAGMA user_version = {version}')
+    conn.execute('COMMIT')
+    print(f"Applied database migration {version}: {migration.__name__}")
+
+def migrate_db(path=None):
+    """Apply any pending schema migrations to an existing database (or shard file)"""
+    path = path or DATABASE
+    conn = sqlite3.connect(path, timeout=30.0, isolation_level=None)
+    try:
+        for version, migration in enumerate(MIGRATIONS, start=1):
+            if not getattr(migration, 'transactional', True):
+                _apply_outside_transaction(conn, version, migration)
+                continue
+            # Take the write lock first so concurrent workers never run the same migration twice
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                current = conn.execute('PRAGMA user_version').fetchone()[0]
+                if current >= version:
+                    conn.execute('ROLLBACK')
+                    continue
+                migration(conn.cursor())
+                conn.execute(f'PRAGMA user_version = {version}')
+                conn.execute('COMMIT')
+                print(f"Applied database migration {version}: {migration.__name__}")
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+    finally:
+        conn.close()
+
+def get_db_connection(path=None, foreign_keys=True):
     """Get a database connection with proper configuration"""
     try:
-        conn = sqlite3.connect(DATABASE, timeout=30.0)
+        conn = sqlite3.connect(path or DATABASE, timeout=30.0)
         conn.row_factory = sqlite3.Row
-        # Enable foreign key constraints
-        conn.execute("PRAGMA foreign_keys = ON")
+        # Enable foreign key constraints (shard files have no users rows to reference)
+        if foreign_keys:
+            conn.execute("PRAGMA foreign_keys = ON")
         # Enable WAL mode for better concurrency
         conn.execute("PRAGMA journal_mode = WAL")
         return conn
     except Exception as e:
         print(f"Error connecting to database: {e}")
         raise
+
+@contextmanager
+def db_connection(conn=None):
+    """Yield the given connection, or open (and close) a new one if none is passed.
+
+    Lets several model calls share one connection, e.g. when building the dashboard payload.
+    """
+    if conn is not None:
+        yield conn
+        return
+    conn = get_db_connection()
+    try:
+        yield conn
+    finally:
+        conn.close()
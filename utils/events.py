@@ -0,0 +1,171 @@
+import json
+import os
+import queue
+import threading
+import time
+from utils.sharding import data_database_paths, get_user_db_connection, open_database
+
+# Limits are per worker process. Each open stream holds one of the worker's GUNICORN_THREADS
+# (see gunicorn.conf.py), so streams may never take the last SSE_RESERVED_THREADS threads,
+# which stay free for page loads and API calls.
+GUNICORN_THREADS = int(os.environ.get('GUNICORN_THREADS', 8))
+SSE_RESERVED_THREADS = int(os.environ.get('SSE_RESERVED_THREADS', 2))
+SSE_MAX_CONNECTIONS = max(0, min(int(os.environ.get('SSE_MAX_CONNECTIONS', GUNICORN_THREADS)),
+                                 GUNICORN_THREADS - SSE_RESERVED_THREADS))
+SSE_MAX_CONNECTIONS_PER_USER = min(int(os.environ.get('SSE_MAX_CONNECTIONS_PER_USER', 5)), SSE_MAX_CONNECTIONS)
+# How often the fan-out poller checks the notify table for events from other workers
+EVENT_POLL_INTERVAL = float(os.environ.get('EVENT_POLL_INTERVAL', 1.0))
+# Notify rows only need to live long enough for every worker's poller to see them
+EVENT_RETENTION_SECONDS = int(os.environ.get('EVENT_RETENTION_SECONDS', 60))
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class ConnectionLimitError(Exception):
+    """Raised when a worker (or user) already has the maximum number of open streams"""
+
+
+def _prune(conn):
+    cursor = conn.execute('DELETE FROM event_notifications WHERE created_at < ?', (time.time() - EVENT_RETENTION_SECONDS,))
+    conn.commit()
+    return cursor.rowcount
+
+
+class EventBroker:
+    """In-process pub/sub for per-user events, fanned out across workers via SQLite notify tables.
+
+    publish() delivers to local subscribers immediately and appends a row to
+    event_notifications in the user's own database file (their shard when sharding
+    is on), so notify writes spread over the same files as the data writes. A
+    poller thread in every worker with open streams reads each file for rows
+    written by other processes. The poller only runs while this worker has
+    subscribers, so idle workers do no polling at all.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._poller = None
+        self._last_ids = {}
+
+    def connection_count(self):
+        with self._lock:
+            return sum(len(queues) for queues in self._subscribers.values())
+
+    def subscribe(self, user_id):
+        """Register a new stream for the user and return its event queue"""
+        with self._lock:
+            total = sum(len(queues) for queues in self._subscribers.values())
+            if total >= SSE_MAX_CONNECTIONS:
+                raise ConnectionLimitError("Too many open event streams")
+            queues = self._subscribers.setdefault(user_id, set())
+            if len(queues) >= SSE_MAX_CONNECTIONS_PER_USER:
+                raise ConnectionLimitError("Too many open event streams for this user")
+            q = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+            queues.add(q)
+            if self._poller is None or not self._poller.is_alive():
+                self._last_ids = {path: self._latest_notification_id(path) for path in data_database_paths()}
+                self._poller = threading.Thread(target=self._poll, name='event-poller', daemon=True)
+                self._poller.start()
+            return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues:
+                queues.discard(q)
+                if not queues:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, event, payload):
+        """Send an event to every stream of the user, in this worker and all others"""
+        self._deliver(user_id, event, payload)
+        conn = get_user_db_connection(user_id)
+        try:
+            conn.execute(
+                """
+                INSERT INTO event_notifications (user_id, event, payload, origin, created_at)
+                VALUES (?, ?, ?, ?, ?)
+                """,
+                (user_id, event, json.dumps(payload), os.getpid(), time.time())
+            )
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _deliver(self, user_id, event, payload):
+        with self._lock:
+            queues = list(self._subscribers.get(user_id, ()))
+        for q in queues:
+            try:
+                q.put_nowait((event, payload))
+            except queue.Full:
+                pass  # A stalled client only misses intermediate events; the next one carries the latest seq
+
+    def _latest_notification_id(self, path):
+        conn = open_database(path)
+        try:
+            return conn.execute('SELECT COALESCE(MAX(id), 0) AS id FROM event_notifications').fetchone()['id']
+        finally:
+            conn.close()
+
+    def _poll_database(self, conn, path, prune):
+        rows = conn.execute(
+            'SELECT id, user_id, event, payload, origin FROM event_notifications WHERE id > ? ORDER BY id',
+            (self._last_ids.get(path, 0),)
+        ).fetchall()
+        if prune:
+            _prune(conn)
+        pid = os.getpid()
+        for row in rows:
+            self._last_ids[path] = row['id']
+            if row['origin'] != pid:
+                self._deliver(row['user_id'], row['event'], json.loads(row['payload']))
+
+    def _poll(self):
+        last_prune = 0
+        # One connection per database file, kept for the lifetime of the poller
+        connections = {}
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscribers:
+                        self._poller = None
+                        return
+                now = time.time()
+                prune = now - last_prune > EVENT_RETENTION_SECONDS
+                try:
+                    for path in data_database_paths():
+                        if path not in connections:
+                            connections[path] = open_database(path)
+                        self._poll_database(connections[path], path, prune)
+                    if prune:
+                        last_prune = now
+                except Exception as e:
+                    print(f"Event poller error: {e}")
+                time.sleep(EVENT_POLL_INTERVAL)
+        finally:
+            for conn in connections.values():
+                conn.close()
+
+
+broker = EventBroker()
+
+
+def publish(user_id, event, payload):
+    """Publish an event without ever failing the caller's (already committed) write"""
+    try:
+        broker.publish(user_id, event, payload)
+    except Exception as e:
+        print(f"Error publishing {event} event: {e}")
+
+
+def prune_notifications():
+    """Drop expired notify rows in every database; the poller only prunes while this worker has streams open"""
+    removed = 0
+    for path in data_database_paths():
+        conn = open_database(path)
+        try:
+            removed += _prune(conn)
+        finally:
+            conn.close()
+    return removed
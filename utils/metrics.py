@@ -0,0 +1,27 @@
+import os
+import threading
+
+_counters = {}
+_gauges = {}
+_lock = threading.Lock()
+
+
+def increment(name, value=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def set_gauge(name, value):
+    """Record the latest value of a measurement (e.g. a file size or a duration)"""
+    with _lock:
+        _gauges[name] = value
+
+
+def snapshot():
+    """Counters and gauges of the current worker process (each gunicorn worker keeps its own)"""
+    with _lock:
+        return {
+            'pid': os.getpid(),
+            'counters': dict(sorted(_counters.items())),
+            'gauges': dict(sorted(_gauges.items()))
+        }
@@ -0,0 +1,110 @@
+import os
+import socket
+import threading
+import time
+from datetime import datetime
+from utils.db import get_db_connection
+
+SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'
+SCHEDULER_TICK_SECONDS = float(os.environ.get('SCHEDULER_TICK_SECONDS', 30))
+
+
+def acquire_lease(name, seconds):
+    """Claim a job for `seconds` across all worker processes; True if this process won it"""
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    now = time.time()
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute(
+            """
+            INSERT INTO job_leases (name, owner, expires_at) VALUES (?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+            WHERE job_leases.expires_at <= ?
+            """,
+            (name, owner, now + seconds, now)
+        )
+        conn.commit()
+        return cursor.rowcount > 0
+    finally:
+        conn.close()
+
+
+def window_remaining(window, now=None):
+    """Seconds left in a daily local-time window "HH:MM-HH:MM" (may cross midnight); 0 outside it"""
+    start, end = (
+        int(hours) * 3600 + int(minutes) * 60
+        for hours, minutes in (part.strip().split(':') for part in window.split('-'))
+    )
+    now = now or datetime.now()
+    current = now.hour * 3600 + now.minute * 60 + now.second
+    if start <= end:
+        return end - current if start <= current < end else 0
+    if current >= start:
+        return 24 * 3600 - current + end
+    return end - current if current < end else 0
+
+
+class Scheduler:
+    """Runs registered jobs on a fixed interval in a background thread.
+
+    Every gunicorn worker runs a scheduler, but a job lease in the database makes
+    sure each job runs in only one of them per interval.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def register(self, name, interval, func, window=None):
+        """Run func every interval seconds, or, with a window ("HH:MM-HH:MM"), once per daily window"""
+        self._jobs[name] = {'interval': interval, 'func': func, 'window': window, 'next_run': 0}
+
+    def start(self):
+        """Start the background thread once per process (safe to call on every request)"""
+        if not SCHEDULER_ENABLED or not self._jobs:
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+            self._thread.start()
+
+    def run_job(self, name):
+        """Run one job immediately in the calling thread"""
+        job = self._jobs[name]
+        started = time.perf_counter()
+        try:
+            result = job['func']()
+            print(f"Scheduled job {name} finished in {time.perf_counter() - started:.2f}s: {result}")
+            return result
+        except Exception as e:
+            print(f"Scheduled job {name} failed: {e}")
+
+    def _run(self):
+        while True:
+            now = time.time()
+            for name, job in list(self._jobs.items()):
+                if now < job['next_run']:
+                    continue
+                lease = job['interval']
+                if job['window']:
+                    # Checked on every tick; the lease lasts until the window closes,
+                    # so exactly one worker runs the job once per window
+                    lease = window_remaining(job['window'])
+                    if not lease:
+                        continue
+                job['next_run'] = now + lease
+                try:
+                    if not acquire_lease(name, lease):
+                        continue
+                except Exception as e:
+                    print(f"Could not acquire lease for job {name}: {e}")
+                    continue
+                self.run_job(name)
+            time.sleep(SCHEDULER_TICK_SECONDS)
+
+
+scheduler = Scheduler()
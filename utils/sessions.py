@@ -0,0 +1,167 @@
+import json
+import os
+import secrets
+import time
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+from utils.cache import TTLCache
+from utils.db import get_db_connection
+
+# Loaded sessions are kept in memory so most requests never touch the sessions table.
+# Revocations reach other workers once their cached copy expires.
+SESSION_CACHE_SIZE = int(os.environ.get('SESSION_CACHE_SIZE', 10000))
+SESSION_CACHE_SECONDS = float(os.environ.get('SESSION_CACHE_SECONDS', 30))
+# Signed-in sessions expire permanent_session_lifetime after last use; the expiry is
+# pushed forward at most this often so active users don't write on every request
+SESSION_REFRESH_SECONDS = float(os.environ.get('SESSION_REFRESH_SECONDS', 86400))
+
+_cache = TTLCache(SESSION_CACHE_SIZE, SESSION_CACHE_SECONDS)
+
+
+class ServerSession(CallbackDict, SessionMixin):
+    """Session data kept server-side; the cookie only carries the random session id"""
+
+    def __init__(self, initial=None, sid=None, expires_at=None):
+        def on_update(self):
+            self.modified = True
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires_at = expires_at
+        self.new = sid is None
+        self.modified = False
+        # Owner when the session was loaded, used to rotate the id on login
+        self.loaded_user_id = self.get('user_id')
+
+
+def _load(sid):
+    """(data, expires_at) for a live session, or None"""
+    cached = _cache.get(sid)
+    if cached is None or cached['expires_at'] <= time.time():
+        # Expired in cache: another worker may have extended it, so check the database
+        conn = get_db_connection()
+        try:
+            row = conn.execute("SELECT user_id, data, expires_at FROM sessions WHERE id = ?", (sid,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            _cache.delete(sid)
+            return None
+        cached = {'user_id': row['user_id'], 'data': json.loads(row['data']), 'expires_at': row['expires_at']}
+        _cache.set(sid, cached)
+    if cached['expires_at'] <= time.time():
+        return None
+    return cached['data'], cached['expires_at']
+
+
+def _extend(session, expires_at):
+    """Push an unchanged session's expiry forward without rewriting its data"""
+    conn = get_db_connection()
+    try:
+        updated = conn.execute("UPDATE sessions SET expires_at = ? WHERE id = ?", (expires_at, session.sid)).rowcount
+        conn.commit()
+    finally:
+        conn.close()
+    if not updated:
+        return  # Revoked meanwhile; don't bring it back into the cache
+    session.expires_at = expires_at
+    _cache.set(session.sid, {'user_id': session.get('user_id'), 'data': dict(session), 'expires_at': expires_at})
+
+
+def _delete(sid):
+    _cache.delete(sid)
+    conn = get_db_connection()
+    try:
+        conn.execute("DELETE FROM sessions WHERE id = ?", (sid,))
+        conn.commit()
+    finally:
+        conn.close()
+
+
+class SqliteSessionInterface(SessionInterface):
+    """Stores sessions in the sessions table of the main database"""
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            loaded = _load(sid)
+            if loaded is not None:
+                return ServerSession(loaded[0], sid, loaded[1])
+        return ServerSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if not session:
+            if session.modified and session.sid:
+                _delete(session.sid)
+                response.delete_cookie(name, domain=domain, path=path)
+            return
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        if not session.modified:
+            # Sliding expiry: active signed-in users are only logged out after a full lifetime of inactivity
+            if session.get('user_id') and session.expires_at is not None:
+                expires_at = time.time() + lifetime
+                if expires_at - session.expires_at >= SESSION_REFRESH_SECONDS:
+                    _extend(session, expires_at)
+            return
+
+        # New sessions and logins get a fresh id so a pre-login id can never be reused
+        if session.new or session.get('user_id') != session.loaded_user_id:
+            if session.sid:
+                _delete(session.sid)
+            session.sid = secrets.token_urlsafe(32)
+        expires_at = time.time() + lifetime
+        data = dict(session)
+        conn = get_db_connection()
+        try:
+            conn.execute(
+                """
+                INSERT INTO sessions (id, user_id, data, expires_at) VALUES (?, ?, ?, ?)
+                ON CONFLICT(id) DO UPDATE SET user_id = excluded.user_id, data = excluded.data, expires_at = excluded.expires_at
+                """,
+                (session.sid, session.get('user_id'), json.dumps(data), expires_at)
+            )
+            conn.commit()
+        finally:
+            conn.close()
+        _cache.set(session.sid, {'user_id': session.get('user_id'), 'data': data, 'expires_at': expires_at})
+
+        response.vary.add('Cookie')
+        response.set_cookie(
+            name,
+            session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=domain,
+            path=path,
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+
+def revoke_user_sessions(user_id, keep_sid=None):
+    """Log the user out everywhere except (optionally) the current session; returns sessions revoked"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute("DELETE FROM sessions WHERE user_id = ? AND id != ?", (user_id, keep_sid or ''))
+        conn.commit()
+    finally:
+        conn.close()
+    _cache.delete_where(lambda entry: entry['user_id'] == user_id)
+    return cursor.rowcount
+
+
+def prune_expired_sessions():
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (time.time(),))
+        conn.commit()
+    finally:
+        conn.close()
+    return cursor.rowcount
+
+
+def init_sessions(app):
+    app.session_interface = SqliteSessionInterface()
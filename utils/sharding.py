@@ -0,0 +1,381 @@
+import argparse
+import glob
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from utils.db import DATABASE, get_db_connection, init_db, migrate_db
+
+# 0 keeps every user's data in the main database; N > 0 spreads users over N shard files
+SHARD_COUNT = int(os.environ.get('SHARD_COUNT', 0))
+SHARD_DIR = os.environ.get('SHARD_DIR') or os.path.join(os.path.dirname(os.path.abspath(DATABASE)), 'shards')
+# How long a worker trusts its cached user -> shard route before re-reading the catalog
+SHARD_ROUTE_CACHE_SECONDS = float(os.environ.get('SHARD_ROUTE_CACHE_SECONDS', 30))
+SHARD_ROUTE_CACHE_SIZE = 100000
+
+# Each shard hands out row ids from its own range, and moved rows get new ids from the target's range,
+# so ids stay unique across shards
+SHARD_ID_RANGE = 10 ** 12
+ID_TABLES = ('transactions', 'recurring_rules', 'budgets')
+# Columns that hold ids allocated from each table's sequence (archived and deleted rows included)
+ID_REFERENCES = {
+    'transactions': (('transactions', 'id'), ('transactions_archive', 'id'),
+                     ('transaction_tombstones', 'transaction_id')),
+    'recurring_rules': (('recurring_rules', 'id'), ('transactions', 'recurring_rule_id'),
+                        ('transactions_archive', 'recurring_rule_id')),
+    'budgets': (('budgets', 'id'),),
+}
+_ID_COLUMNS = {reference: table for table, references in ID_REFERENCES.items() for reference in references}
+# Tables whose rows belong to exactly one user and live in that user's shard
+USER_TABLES = ('transactions', 'transaction_tombstones', 'sync_state', 'recurring_rules', 'budgets', 'category_spend',
+               'transactions_archive', 'monthly_aggregates', 'archive_state')
+
+# Catalog value for users whose data is still in the main database
+MAIN_DATABASE = -1
+
+_routes = {}
+_routes_lock = threading.Lock()
+_ready_shards = set()
+_ready_lock = threading.Lock()
+
+
+class ShardMovingError(Exception):
+    """The user's data is being moved between shards; the request can be retried shortly"""
+
+
+class ShardConflictError(Exception):
+    """The target of a move already holds rows for the user, so copying would overwrite them"""
+
+
+def sharding_enabled():
+    return SHARD_COUNT > 0
+
+
+def stable_shard(user_id, shard_count=None):
+    """Jump consistent hash: growing from N to N+1 shards only relocates ~1/(N+1) of users"""
+    key, bucket, j = int(user_id), -1, 0
+    buckets = shard_count or SHARD_COUNT
+    while j < buckets:
+        bucket = j
+        key = (key * 2862933555777941757 + 1) & 0xFFFFFFFFFFFFFFFF
+        j = int((bucket + 1) * (float(1 << 31) / float((key >> 33) + 1)))
+    return bucket
+
+
+def shard_path(shard):
+    if shard == MAIN_DATABASE:
+        return DATABASE
+    return os.path.join(SHARD_DIR, f'shard_{shard:03d}.db')
+
+
+def ensure_shard(shard):
+    """Create (or migrate) a shard file on first use and return its path"""
+    path = shard_path(shard)
+    if shard == MAIN_DATABASE or shard in _ready_shards:
+        return path
+    with _ready_lock:
+        if shard in _ready_shards:
+            return path
+        if os.path.exists(path):
+            migrate_db(path)
+        else:
+            os.makedirs(SHARD_DIR, exist_ok=True)
+            # Build the file under a temporary name and link it into place so that
+            # concurrent workers never initialize (and wipe) the same shard twice
+            tmp = f'{path}.{os.getpid()}.tmp'
+            init_db(tmp)
+            conn = sqlite3.connect(tmp)
+            try:
+                base = (shard + 1) * SHARD_ID_RANGE
+                conn.executemany(
+                    "INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)",
+                    [(table, base) for table in ID_TABLES]
+                )
+                conn.commit()
+            finally:
+                conn.close()
+            try:
+                os.link(tmp, path)
+            except FileExistsError:
+                pass
+            finally:
+                os.remove(tmp)
+        _ready_shards.add(shard)
+    return path
+
+
+def shard_indexes():
+    """Every shard that is configured or still exists on disk (e.g. after shrinking SHARD_COUNT)"""
+    indexes = set(range(SHARD_COUNT))
+    for path in glob.glob(os.path.join(SHARD_DIR, 'shard_*.db')):
+        match = re.search(r'shard_(\d+)\.db$', path)
+        if match:
+            indexes.add(int(match.group(1)))
+    return sorted(indexes)
+
+
+def data_database_paths():
+    """Paths of every database file that can hold per-user data.
+
+    With sharding on this still includes the main database, which keeps serving
+    users whose data was there before sharding until `migrate` moves them.
+    """
+    if not sharding_enabled():
+        return [DATABASE]
+    return [DATABASE] + [ensure_shard(shard) for shard in shard_indexes()]
+
+
+def prepare_shards():
+    """Create or migrate all configured shard files (run once at startup)"""
+    for shard in range(SHARD_COUNT):
+        ensure_shard(shard)
+
+
+def _has_rows(conn, user_id):
+    return any(
+        conn.execute(f"SELECT 1 FROM {table} WHERE user_id = ? LIMIT 1", (user_id,)).fetchone()
+        for table in USER_TABLES
+    )
+
+
+def shard_for_user(user_id):
+    """Look up (and on first use, assign) the user's shard through the catalog"""
+    now = time.monotonic()
+    cached = _routes.get(user_id)
+    if cached and cached[2] > now:
+        shard, moving = cached[0], cached[1]
+    else:
+        conn = get_db_connection()
+        try:
+            row = conn.execute("SELECT shard, moving FROM user_shards WHERE user_id = ?", (user_id,)).fetchone()
+            if row is None:
+                # Users who already have data in the main database stay there until they are moved
+                shard = MAIN_DATABASE if _has_rows(conn, user_id) else stable_shard(user_id)
+                conn.execute("INSERT OR IGNORE INTO user_shards (user_id, shard) VALUES (?, ?)", (user_id, shard))
+                conn.commit()
+                row = conn.execute("SELECT shard, moving FROM user_shards WHERE user_id = ?", (user_id,)).fetchone()
+        finally:
+            conn.close()
+        shard, moving = row['shard'], row['moving']
+        with _routes_lock:
+            if len(_routes) >= SHARD_ROUTE_CACHE_SIZE:
+                _routes.clear()
+            _routes[user_id] = (shard, moving, now + SHARD_ROUTE_CACHE_SECONDS)
+    if moving:
+        raise ShardMovingError("Your data is being moved, please retry in a moment")
+    return shard
+
+
+def open_database(path):
+    """Connection to a main or shard database file; shards have no users rows for foreign keys"""
+    return get_db_connection(path, foreign_keys=(path == DATABASE))
+
+
+def get_user_db_connection(user_id):
+    """Connection to the database file that holds this user's transactions"""
+    if not sharding_enabled():
+        return get_db_connection()
+    return open_database(ensure_shard(shard_for_user(user_id)))
+
+
+@contextmanager
+def user_db_connection(user_id, conn=None):
+    """Like utils.db.db_connection, but opens the user's shard when no connection is passed"""
+    if conn is not None:
+        yield conn
+        return
+    conn = get_user_db_connection(user_id)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def _renumber(conn, user_id):
+    """Map the user's ids to fresh ids from the target's sequences, in temp.id_map_<table>.
+
+    SQLite hands out max(sqlite_sequence, largest id in the table) + 1, so rows copied with
+    ids from another shard's range would move the target's allocation into that range.
+    """
+    for table, references in ID_REFERENCES.items():
+        conn.execute(f"DROP TABLE IF EXISTS temp.id_map_{table}")
+        conn.execute(f"CREATE TEMP TABLE id_map_{table} (old INTEGER PRIMARY KEY, new INTEGER NOT NULL)")
+        row = conn.execute("SELECT seq FROM target.sqlite_sequence WHERE name = ?", (table,)).fetchone()
+        largest = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM target.{table}").fetchone()[0]
+        base = max(row[0] if row else 0, largest)
+        old_ids = ' UNION '.join(
+            f"SELECT {column} AS old FROM main.{source} WHERE user_id = ? AND {column} IS NOT NULL"
+            for source, column in references
+        )
+        conn.execute(
+            f"INSERT INTO temp.id_map_{table} (old, new) "
+            f"SELECT old, ? + ROW_NUMBER() OVER (ORDER BY old) FROM ({old_ids})",
+            (base,) + (user_id,) * len(references)
+        )
+        # Ids of archived and deleted rows are not inserted into the table, so advance the sequence explicitly
+        seq = conn.execute(f"SELECT COALESCE(MAX(new), ?) FROM temp.id_map_{table}", (base,)).fetchone()[0]
+        if not conn.execute("UPDATE target.sqlite_sequence SET seq = ? WHERE name = ?", (seq, table)).rowcount:
+            conn.execute("INSERT INTO target.sqlite_sequence (name, seq) VALUES (?, ?)", (table, seq))
+
+
+def _copy_user(user_id, source, target):
+    """Copy then delete all of a user's rows from one shard to another in a single write transaction.
+
+    Rows get new ids from the target's range, and references to them are rewritten to match.
+
+    Refuses (ShardConflictError) if the target already has rows for the user: they may be
+    newer than the source, and replacing them would lose writes or reset counters.
+    """
+    source_path, target_path = ensure_shard(source), ensure_shard(target)
+    conn = sqlite3.connect(source_path, timeout=30.0, isolation_level=None)
+    try:
+        conn.execute("ATTACH DATABASE ? AS target", (target_path,))
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conflicts = [
+                table for table in USER_TABLES
+                if conn.execute(f"SELECT 1 FROM target.{table} WHERE user_id = ? LIMIT 1", (user_id,)).fetchone()
+            ]
+            if conflicts:
+                raise ShardConflictError(
+                    f"{target_path} already has rows for user {user_id} in {', '.join(conflicts)}"
+                )
+            _renumber(conn, user_id)
+            moved = 0
+            for table in USER_TABLES:
+                columns = [row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")]
+                values = [
+                    f"(SELECT new FROM temp.id_map_{_ID_COLUMNS[table, column]} WHERE old = {column})"
+                    if (table, column) in _ID_COLUMNS else column
+                    for column in columns
+                ]
+                cursor = conn.execute(
+                    f"INSERT INTO target.{table} ({', '.join(columns)}) "
+                    f"SELECT {', '.join(values)} FROM main.{table} WHERE user_id = ?",
+                    (user_id,)
+                )
+                moved += max(cursor.rowcount, 0)
+                conn.execute(f"DELETE FROM main.{table} WHERE user_id = ?", (user_id,))
+            # Clients still hold the old ids: bump the sequence past the pruned mark so they fetch a full snapshot
+            conn.execute("UPDATE target.sync_state SET seq = seq + 1, pruned_seq = seq + 1 WHERE user_id = ?", (user_id,))
+            conn.execute("COMMIT")
+            return moved
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    finally:
+        conn.close()
+
+
+def move_users(moves, wait=True):
+    """Move users' data between shards: moves is a list of (user_id, source_shard, target_shard).
+
+    Users are first marked as moving in the catalog, then we wait until every worker's
+    cached route has expired, so no request can still write to the old location.
+    A user whose target already holds rows, or whose copy fails, is skipped and stays where
+    the catalog says.
+    """
+    if not moves:
+        return 0
+    catalog = get_db_connection()
+    try:
+        catalog.executemany(
+            """
+            INSERT INTO user_shards (user_id, shard, moving) VALUES (?, ?, 1)
+            ON CONFLICT(user_id) DO UPDATE SET moving = 1
+            """,
+            [(user_id, source) for user_id, source, _ in moves]
+        )
+        catalog.commit()
+        if wait:
+            print(f"Waiting {SHARD_ROUTE_CACHE_SECONDS:.0f}s for cached shard routes to expire...")
+            time.sleep(SHARD_ROUTE_CACHE_SECONDS)
+        moved = 0
+        for user_id, source, target in moves:
+            try:
+                rows = _copy_user(user_id, source, target)
+            except (ShardConflictError, sqlite3.Error) as e:
+                # The copy was rolled back, so the user keeps being served from the source
+                catalog.execute("UPDATE user_shards SET moving = 0 WHERE user_id = ?", (user_id,))
+                catalog.commit()
+                print(f"Skipped user {user_id}: {e}")
+                continue
+            catalog.execute("UPDATE user_shards SET shard = ?, moving = 0 WHERE user_id = ?", (target, user_id))
+            catalog.commit()
+            moved += 1
+            print(f"Moved user {user_id} from {shard_path(source)} to {shard_path(target)} ({rows} rows)")
+    finally:
+        catalog.close()
+    return moved
+
+
+def plan_migration():
+    """Users whose data still lives in the main database (e.g. before sharding was enabled)"""
+    conn = get_db_connection()
+    try:
+        user_ids = set()
+        for table in USER_TABLES:
+            user_ids.update(row['user_id'] for row in conn.execute(f"SELECT DISTINCT user_id FROM {table}"))
+        return [(user_id, MAIN_DATABASE, stable_shard(user_id)) for user_id in sorted(user_ids)]
+    finally:
+        conn.close()
+
+
+def plan_rebalance():
+    """Users whose catalog shard differs from their hash under the current SHARD_COUNT"""
+    conn = get_db_connection()
+    try:
+        rows = conn.execute("SELECT user_id, shard FROM user_shards").fetchall()
+    finally:
+        conn.close()
+    return [
+        (row['user_id'], row['shard'], stable_shard(row['user_id']))
+        for row in rows
+        if row['shard'] != stable_shard(row['user_id'])
+    ]
+
+
+def shard_status():
+    conn = get_db_connection()
+    try:
+        counts = dict(conn.execute("SELECT shard, COUNT(*) FROM user_shards GROUP BY shard").fetchall())
+    finally:
+        conn.close()
+    for shard in shard_indexes():
+        path = shard_path(shard)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        print(f"shard {shard:3d}: {counts.get(shard, 0):6d} users, {size / 1024:10.1f} KiB  {path}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Manage per-user database shards")
+    parser.add_argument('command', choices=['status', 'migrate', 'rebalance', 'move'])
+    parser.add_argument('user_id', nargs='?', type=int, help="user to move (move only)")
+    parser.add_argument('shard', nargs='?', type=int, help="target shard (move only)")
+    parser.add_argument('--no-wait', action='store_true',
+                        help="skip waiting for cached routes to expire (only when the app is stopped)")
+    args = parser.parse_args()
+
+    if args.command != 'status' and not sharding_enabled():
+        parser.error("Set SHARD_COUNT to the number of shards first")
+    migrate_db()
+    prepare_shards()
+
+    if args.command == 'status':
+        shard_status()
+    elif args.command == 'migrate':
+        print(f"Moved {move_users(plan_migration(), wait=not args.no_wait)} user(s) out of the main database")
+    elif args.command == 'rebalance':
+        print(f"Rebalanced {move_users(plan_rebalance(), wait=not args.no_wait)} user(s)")
+    else:
+        if args.user_id is None or args.shard is None:
+            parser.error("move requires a user_id and a target shard")
+        catalog = get_db_connection()
+        try:
+            row = catalog.execute("SELECT shard FROM user_shards WHERE user_id = ?", (args.user_id,)).fetchone()
+        finally:
+            catalog.close()
+        source = row['shard'] if row else MAIN_DATABASE
+        move_users([(args.user_id, source, args.shard)], wait=not args.no_wait)
@@ -0,0 +1,47 @@
+import os
+
+# Set by the gunicorn master (gunicorn.conf.py) once startup has run, so forked workers skip it
+STARTUP_DONE_ENV = 'FINANCE_TRACKER_STARTUP_DONE'
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'static')
+
+
+def startup_done():
+    return os.environ.get(STARTUP_DONE_ENV) == 'true'
+
+
+def run_startup(static_folder=STATIC_FOLDER):
+    """One-time setup before serving: create or migrate the database and shards, precompress assets"""
+    # Imported here so that checking startup_done() stays cheap
+    from utils.db import DATABASE, init_db, migrate_db, reset_database
+    from utils.sharding import prepare_shards, sharding_enabled
+    from utils.assets import precompress_static
+
+    # Only reset database if explicitly requested via environment variable
+    if os.environ.get('RESET_DB', 'false').lower() == 'true':
+        print("RESET_DB environment variable set - Resetting database...")
+        reset_database()
+        init_db()
+        print("Database reset and initialized with clean state")
+    else:
+        # Check if database exists, if not create it
+        if not os.path.exists(DATABASE):
+            print("Database doesn't exist - Creating new database...")
+            init_db()
+            print("Database initialized successfully")
+        else:
+            print("Database exists - Skipping initialization")
+            migrate_db()
+
+    if sharding_enabled():
+        prepare_shards()
+
+    # Build .gz/.br copies of static assets so they are never compressed per request
+    try:
+        precompressed = precompress_static(static_folder)
+        if precompressed:
+            print(f"Precompressed {precompressed} static file(s)")
+    except OSError as e:
+        print(f"Skipping static precompression: {e}")
+
+    os.environ[STARTUP_DONE_ENV] = 'true'